@@ -0,0 +1,457 @@
+"""
+JSON HTTP API for Smart Portfolio Builder
+asyncio service exposing the calculators to other backends
+
+Usage: python api.py [--host 127.0.0.1] [--port 8000]
+
+Routes (POST, JSON body; keys are the calculator's parameter names):
+    /sip             monthly_sip, annual_return, years
+    /retirement      current_age, retirement_age, current_savings, monthly_savings,
+                     annual_return, annual_inflation, monthly_expenses
+    /tax             income, regime ('old' | 'new'), fiscal_year
+    /emi             principal, annual_rate (percent), years (whole, 1 to 100)
+    /mutual-funds    investment, annual_return, years, is_sip
+    /scenarios       portfolio ({asset: percent}), initial, monthly, years (whole, 1 to 100)
+Each route has a ``/batch`` twin taking ``{"requests": [...]}`` and answering
+``{"results": [...]}``, evaluated in one vectorized pass. ``GET /health``
+reports liveness, request-coalescing counters and scheduler metrics;
+``GET /metrics`` adds cache statistics and the per-route latency spans
+(recorded when SPB_PROFILE is set, see instrumentation).
+
+Identical requests that arrive while one is being computed share its
+response (cache.FLIGHTS), so a burst of users on the same default inputs
+costs one computation per distinct body. The computation itself runs on the
+shared scheduler: single requests at interactive priority, batches behind
+them. Each client address has a small quota of requests in progress;
+backends sending an ``X-API-Key`` listed in SPB_API_KEYS are metered per key
+with SPB_API_KEY_QUOTA instead. A batch over its client's quota waits up to
+BATCH_QUOTA_WAIT seconds for a slot, a single request is refused at once.
+Admission and waiting happen on the event loop and computations only on the
+scheduler's workers, so one client's backlog never holds threads that
+others (or /health) need.
+Refused requests are answered 429 (quota) or 503 (queue full) with a
+Retry-After header; an unknown API key is answered 401.
+"""
+
+import argparse
+import asyncio
+import inspect
+import json
+import hmac
+import math
+import os
+import time
+from http import HTTPStatus
+
+import numpy as np
+
+from cache import CACHE, FLIGHTS
+from instrumentation import dump, span
+from scheduler import BATCH, INTERACTIVE, SCHEDULER, QuotaExceeded, SchedulerBusy
+from core import (SCENARIOS, DEFAULT_FISCAL_YEAR, TAX_TABLES, allocation_weights,
+                  calculate_sip, calculate_sip_batch, calculate_retirement, calculate_retirement_batch,
+                  calculate_tax_india, calculate_tax_batch, calculate_loan_emi, calculate_loan_emi_batch,
+                  calculate_mutual_fund_returns, calculate_mutual_fund_batch, calculate_scenarios,
+                  calculate_scenario_batch)
+
+MAX_BODY = 16 * 1024 * 1024
+MAX_BATCH = 100_000
+MAX_YEARS = 100
+
+API_KEYS = tuple(key for key in os.environ.get('SPB_API_KEYS', '').split(',') if key)
+API_KEY_QUOTA = int(os.environ.get('SPB_API_KEY_QUOTA', 32))
+BATCH_QUOTA_WAIT = 30.0  # seconds
+QUOTA_POLL = 0.05  # seconds between admission attempts of a waiting batch
+
+class APIError(Exception):
+    """Error answered to the client with an HTTP status and a JSON message"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+# ===== ARGUMENTS =====
+
+def _parameters(func):
+    """{name: default or inspect.Parameter.empty} of a calculator"""
+    return {name: p.default for name, p in inspect.signature(func).parameters.items()}
+
+def _number(value, name):
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+        raise APIError(HTTPStatus.BAD_REQUEST, f"'{name}' must be a finite number")
+    return value
+
+def _flag(value, name):
+    if not isinstance(value, bool):
+        raise APIError(HTTPStatus.BAD_REQUEST, f"'{name}' must be true or false")
+    return value
+
+def _whole_years(years):
+    if years != int(years) or not 1 <= years <= MAX_YEARS:
+        raise APIError(HTTPStatus.BAD_REQUEST,
+                       f"'years' must be a whole number of years from 1 to {MAX_YEARS}")
+    return int(years)
+
+def _single_arguments(func, body, numeric):
+    """Validated keyword arguments for one calculator call"""
+    if not isinstance(body, dict):
+        raise APIError(HTTPStatus.BAD_REQUEST, 'request body must be a JSON object')
+    parameters = _parameters(func)
+    unknown = set(body) - set(parameters)
+    if unknown:
+        raise APIError(HTTPStatus.BAD_REQUEST, f"unknown fields: {', '.join(sorted(unknown))}")
+    missing = [name for name, default in parameters.items()
+               if default is inspect.Parameter.empty and name not in body]
+    if missing:
+        raise APIError(HTTPStatus.BAD_REQUEST, f"missing fields: {', '.join(missing)}")
+    return {name: _number(value, name) if name in numeric else value for name, value in body.items()}
+
+def _batch_items(body):
+    items = body.get('requests') if isinstance(body, dict) else body
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        raise APIError(HTTPStatus.BAD_REQUEST, "batch body must be {'requests': [{...}, ...]}")
+    if len(items) > MAX_BATCH:
+        raise APIError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f'at most {MAX_BATCH} requests per batch')
+    return items
+
+def _column(items, name, default=inspect.Parameter.empty, dtype=float):
+    """One argument across a batch as an array (``default`` fills absent keys)"""
+    try:
+        if default is inspect.Parameter.empty:
+            values = [item[name] for item in items]
+        else:
+            values = [item.get(name, default) for item in items]
+    except KeyError:
+        index = next(i for i, item in enumerate(items) if name not in item)
+        raise APIError(HTTPStatus.BAD_REQUEST, f"requests[{index}] is missing '{name}'") from None
+    if dtype is object:
+        return np.array(values, dtype=object)
+    if dtype is bool:
+        if not all(isinstance(value, bool) for value in values):
+            raise APIError(HTTPStatus.BAD_REQUEST, f"'{name}' must be true or false in every request")
+        return np.array(values, dtype=bool)
+    try:
+        column = np.array(values, dtype=dtype)
+    except (TypeError, ValueError):
+        raise APIError(HTTPStatus.BAD_REQUEST, f"'{name}' must be numeric in every request") from None
+    if column.dtype.kind == 'f' and not np.isfinite(column).all():
+        raise APIError(HTTPStatus.BAD_REQUEST, f"'{name}' must be finite in every request")
+    return column
+
+def _columns(func, items, flags=()):
+    """Every argument of ``func`` across a batch; names in ``flags`` are booleans"""
+    return {name: _column(items, name, default, bool if name in flags else float)
+            for name, default in _parameters(func).items()}
+
+# ===== RESULTS =====
+
+def _values(array):
+    """Array as a JSON-safe list (non-finite floats become null)"""
+    values = np.asarray(array).tolist()
+    if np.asarray(array).dtype.kind == 'f' and not np.isfinite(array).all():
+        values = [v if math.isfinite(v) else None for v in values]
+    return values
+
+def _records(result, size):
+    """Column dict of arrays -> list of ``size`` row dicts"""
+    keys = list(result)
+    columns = [_values(np.broadcast_to(result[key], (size,))) for key in keys]
+    return [dict(zip(keys, row)) for row in zip(*columns)]
+
+def _finite(value):
+    return value if not isinstance(value, float) or math.isfinite(value) else None
+
+# ===== CALCULATORS =====
+
+def sip(body):
+    return calculate_sip(**_single_arguments(calculate_sip, body,
+                                             {'monthly_sip', 'annual_return', 'years'}))
+
+def sip_batch(items):
+    return _records(calculate_sip_batch(**_columns(calculate_sip, items)), len(items))
+
+RETIREMENT_FIELDS = set(_parameters(calculate_retirement))
+
+def retirement(body):
+    return calculate_retirement(**_single_arguments(calculate_retirement, body, RETIREMENT_FIELDS))
+
+def retirement_batch(items):
+    return _records(calculate_retirement_batch(**_columns(calculate_retirement, items)), len(items))
+
+def _check_tax_options(regimes, fiscal_years):
+    if not all(regime in ('old', 'new') for regime in regimes):
+        raise APIError(HTTPStatus.BAD_REQUEST, "'regime' must be 'old' or 'new'")
+    if not all(year is None or isinstance(year, str) and year in TAX_TABLES for year in fiscal_years):
+        raise APIError(HTTPStatus.BAD_REQUEST, f"'fiscal_year' must be one of {', '.join(TAX_TABLES)}")
+
+def tax(body):
+    arguments = _single_arguments(calculate_tax_india, body, {'income'})
+    _check_tax_options([arguments.get('regime', 'old')], [arguments.get('fiscal_year')])
+    return calculate_tax_india(**arguments)
+
+def tax_batch(items):
+    income = _column(items, 'income')
+    regime = _column(items, 'regime', 'old', dtype=object)
+    fiscal_year = _column(items, 'fiscal_year', None, dtype=object)
+    _check_tax_options(regime, fiscal_year)
+    fiscal_year = np.array([year or DEFAULT_FISCAL_YEAR for year in fiscal_year])
+    result = {}
+    for year in set(fiscal_year):
+        rows = fiscal_year == year
+        part = calculate_tax_batch(income[rows], regime[rows].astype(str), year)
+        for key, values in part.items():
+            result.setdefault(key, np.empty(len(items)))[rows] = values
+    return _records(result, len(items))
+
+def emi(body):
+    arguments = _single_arguments(calculate_loan_emi, body, {'principal', 'annual_rate', 'years'})
+    arguments['years'] = _whole_years(arguments['years'])
+    result = calculate_loan_emi(**arguments)
+    schedule = result.pop('amortization')
+    yearly = schedule.yearly()
+    result['amortization_yearly'] = _records(yearly, len(yearly['Year']))
+    return result
+
+def emi_batch(items):
+    return _records(calculate_loan_emi_batch(**_columns(calculate_loan_emi, items)), len(items))
+
+def mutual_funds(body):
+    arguments = _single_arguments(calculate_mutual_fund_returns, body,
+                                  {'investment', 'annual_return', 'years'})
+    arguments['is_sip'] = _flag(arguments.get('is_sip', False), 'is_sip')
+    return calculate_mutual_fund_returns(**arguments)
+
+def mutual_funds_batch(items):
+    columns = _columns(calculate_mutual_fund_returns, items, flags={'is_sip'})
+    return _records(calculate_mutual_fund_batch(**columns), len(items))
+
+def _portfolio(value, index=None):
+    where = f'requests[{index}].' if index is not None else ''
+    if not isinstance(value, dict) or not all(isinstance(v, (int, float)) and not isinstance(v, bool)
+                                              for v in value.values()):
+        raise APIError(HTTPStatus.BAD_REQUEST, f"{where}portfolio must map asset classes to percentages")
+    return value
+
+def scenarios(body):
+    arguments = _single_arguments(calculate_scenarios, body, {'initial', 'monthly', 'years'})
+    arguments['portfolio'] = _portfolio(arguments['portfolio'])
+    arguments['years'] = _whole_years(arguments['years'])
+    result = calculate_scenarios(**arguments)
+    return {
+        scenario: {
+            **{key: value for key, value in data.items() if key != 'projections'},
+            'projections': _values(data['projections'].yearly().values)
+        }
+        for scenario, data in result.items()
+    }
+
+def scenarios_batch(items):
+    portfolios = _column(items, 'portfolio', dtype=object)
+    weights = np.array([allocation_weights(_portfolio(p, i)) for i, p in enumerate(portfolios)])
+    result = calculate_scenario_batch(weights, _column(items, 'initial'),
+                                      _column(items, 'monthly'), _column(items, 'years'))
+    columns = {}
+    for i, scenario in enumerate(SCENARIOS):
+        columns[scenario] = list(zip(_values(result['annual_returns'][:, i]),
+                                     _values(result['final_values'][:, i]),
+                                     _values(result['gains'][:, i])))
+    total_invested = _values(result['total_invested'])
+    return [{scenario: {'annual_return': columns[scenario][row][0],
+                        'final_value': columns[scenario][row][1],
+                        'total_invested': total_invested[row],
+                        'gain': columns[scenario][row][2]}
+             for scenario in SCENARIOS}
+            for row in range(len(items))]
+
+# route -> (single handler, batch handler)
+ENDPOINTS = {
+    '/sip': (sip, sip_batch),
+    '/retirement': (retirement, retirement_batch),
+    '/tax': (tax, tax_batch),
+    '/emi': (emi, emi_batch),
+    '/mutual-funds': (mutual_funds, mutual_funds_batch),
+    '/scenarios': (scenarios, scenarios_batch),
+}
+
+def handle(method, path, body):
+    """(status, payload) for one request; runs in a worker thread"""
+    if path == '/health':
+        return HTTPStatus.OK, {'status': 'ok', 'endpoints': sorted(ENDPOINTS),
+                               'coalescing': FLIGHTS.stats(), 'scheduler': SCHEDULER.stats()}
+    if path == '/metrics':
+        return HTTPStatus.OK, {**dump(), 'cache': CACHE.stats(), 'coalescing': FLIGHTS.stats(),
+                               'scheduler': SCHEDULER.stats()}
+    batch = path.endswith('/batch')
+    route = path[:-len('/batch')] if batch else path
+    if route not in ENDPOINTS:
+        raise APIError(HTTPStatus.NOT_FOUND, f'no route {path}')
+    if method != 'POST':
+        raise APIError(HTTPStatus.METHOD_NOT_ALLOWED, 'use POST')
+    try:
+        payload = json.loads(body or b'null')
+    except ValueError:
+        raise APIError(HTTPStatus.BAD_REQUEST, 'request body is not valid JSON') from None
+    single, many = ENDPOINTS[route]
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        if batch:
+            items = _batch_items(payload)
+            return HTTPStatus.OK, {'results': many(items) if items else []}
+        result = single(payload)
+    return HTTPStatus.OK, {key: _finite(value) for key, value in result.items()}
+
+def _encode(payload):
+    return json.dumps(payload, separators=(',', ':')).encode()
+
+def _span_name(path):
+    route = path[:-len('/batch')] if path.endswith('/batch') else path
+    # Unknown paths share one span so clients cannot grow the recorder
+    return f'api.{path}' if route in ENDPOINTS or path in ('/health', '/metrics') else 'api.unknown'
+
+def _handle_encoded(method, path, body):
+    with span(_span_name(path)):
+        status, payload = handle(method, path, body)
+        return status, _encode(payload)
+
+async def _handle_scheduled(method, path, body, session, quota):
+    """Admit a request to the scheduler without blocking the loop and await its job
+
+    A batch over its client's quota retries admission every QUOTA_POLL
+    seconds for up to BATCH_QUOTA_WAIT seconds.
+    """
+    batch = path.endswith('/batch')
+    deadline = time.monotonic() + (BATCH_QUOTA_WAIT if batch else 0)
+    while True:
+        try:
+            job = SCHEDULER.submit(_handle_encoded, method, path, body, session=session, quota=quota,
+                                   priority=BATCH if batch else INTERACTIVE)
+            break
+        except QuotaExceeded:
+            if time.monotonic() >= deadline:
+                raise
+            await asyncio.sleep(QUOTA_POLL)
+    return await asyncio.wrap_future(job.future)
+
+async def handle_request(method, path, body, session=None, quota=None):
+    """(status, encoded body) for a request, sharing one execution between identical
+    requests in flight (serialization included)
+
+    Runs on the event loop: computations run on the scheduler's workers and
+    are awaited, so no thread is held per request. Admission is the leader's
+    own: when the scheduler refuses it, waiting identical requests retry
+    under their own session instead of sharing the refusal.
+    """
+    if method != 'POST':
+        return _handle_encoded(method, path, body)  # /health, /metrics and errors: cheap
+    try:
+        response, _ = await FLIGHTS.do_async(('api', path, body), _handle_scheduled, method, path,
+                                             body, session, quota, unshared=(SchedulerBusy,))
+    except QuotaExceeded as exc:
+        raise APIError(HTTPStatus.TOO_MANY_REQUESTS, str(exc)) from None
+    except SchedulerBusy as exc:
+        raise APIError(HTTPStatus.SERVICE_UNAVAILABLE, str(exc)) from None
+    return response
+
+def _client(headers, address):
+    """(scheduler session, quota) for a request: its API key if it has one, else its address"""
+    key = headers.get('x-api-key')
+    if key is None:
+        return address, None
+    if not any(hmac.compare_digest(key.encode(), known.encode()) for known in API_KEYS):
+        raise APIError(HTTPStatus.UNAUTHORIZED, 'unknown API key')
+    return ('api-key', key), API_KEY_QUOTA
+
+# ===== HTTP =====
+
+async def _read_request(reader):
+    """(method, path, version, headers, body), or None when the client hung up"""
+    line = await reader.readline()
+    if not line.strip():
+        return None
+    try:
+        method, target, version = line.decode('latin-1').split()
+    except ValueError:
+        raise APIError(HTTPStatus.BAD_REQUEST, 'malformed request line') from None
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    if 'chunked' in headers.get('transfer-encoding', '').lower():
+        raise APIError(HTTPStatus.LENGTH_REQUIRED, 'send a Content-Length body')
+    try:
+        length = int(headers.get('content-length') or 0)
+    except ValueError:
+        length = -1
+    if length < 0:
+        raise APIError(HTTPStatus.BAD_REQUEST, 'Content-Length must be a non-negative integer')
+    if length > MAX_BODY:
+        raise APIError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f'body over {MAX_BODY} bytes')
+    body = await reader.readexactly(length) if length else b''
+    return method.upper(), target.split('?', 1)[0].rstrip('/') or '/', version, headers, body
+
+def _response(status, body, keep_alive, elapsed=None):
+    head = [f'HTTP/1.1 {status.value} {status.phrase}',
+            'Content-Type: application/json',
+            f'Content-Length: {len(body)}',
+            'Connection: keep-alive' if keep_alive else 'Connection: close']
+    if elapsed is not None:
+        head.append(f'Server-Timing: compute;dur={elapsed * 1000:.3f}')
+    if status in (HTTPStatus.TOO_MANY_REQUESTS, HTTPStatus.SERVICE_UNAVAILABLE):
+        head.append('Retry-After: 1')
+    return ('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + body
+
+async def handle_connection(reader, writer):
+    """Serve HTTP/1.1 requests on one connection until it closes"""
+    peer = writer.get_extra_info('peername')
+    client = peer[0] if isinstance(peer, tuple) else peer
+    try:
+        while True:
+            keep_alive = False
+            try:
+                request = await _read_request(reader)
+                if request is None:
+                    break
+                method, path, version, headers, body = request
+                keep_alive = (version == 'HTTP/1.1' and
+                              headers.get('connection', '').lower() != 'close')
+                session, quota = _client(headers, client)
+                start = time.perf_counter()
+                status, encoded = await handle_request(method, path, body, session, quota)
+                response = _response(status, encoded, keep_alive, time.perf_counter() - start)
+            except APIError as exc:
+                response = _response(HTTPStatus(exc.status), _encode({'error': exc.message}),
+                                     keep_alive)
+            except Exception as exc:  # answer 500 rather than drop the connection
+                response = _response(HTTPStatus.INTERNAL_SERVER_ERROR,
+                                     _encode({'error': f'{type(exc).__name__}: {exc}'}), False)
+                keep_alive = False
+            writer.write(response)
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+async def serve(host='127.0.0.1', port=8000):
+    server = await asyncio.start_server(handle_connection, host, port)
+    async with server:
+        await server.serve_forever()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve the calculators as a JSON HTTP API')
+    parser.add_argument('--host', default='127.0.0.1', help='interface to bind')
+    parser.add_argument('--port', type=int, default=8000, help='port to listen on')
+    args = parser.parse_args(argv)
+    print(f'serving on http://{args.host}:{args.port}')
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
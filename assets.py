@@ -0,0 +1,67 @@
+"""
+Static assets for Smart Portfolio Builder
+Serves the theme stylesheets as content-hashed static files
+"""
+
+import functools
+import hashlib
+import os
+import re
+from pathlib import Path
+
+import streamlit as st
+
+STYLES_DIR = Path(__file__).parent / 'styles'
+STATIC_DIR = Path(__file__).parent / 'static'  # served by Streamlit at app/static/
+STATIC_URL = 'app/static'
+
+# Older releases serve static .css as text/plain with nosniff, so browsers drop a linked sheet
+CSS_STATIC_SERVING_SINCE = (1, 65)
+
+@functools.lru_cache(maxsize=None)
+def read_stylesheet(name):
+    """Source of styles/<name>.css"""
+    return (STYLES_DIR / f'{name}.css').read_text(encoding='utf-8')
+
+@functools.lru_cache(maxsize=None)
+def publish_stylesheet(name):
+    """Publish styles/<name>.css as static/<name>.<hash>.css and return its URL
+
+    The file name changes whenever the stylesheet does, so browsers may keep
+    a published copy indefinitely. Older builds of the same sheet are removed.
+    """
+    css = read_stylesheet(name).encode('utf-8')
+    filename = f'{name}.{hashlib.sha256(css).hexdigest()[:12]}.css'
+    target = STATIC_DIR / filename
+    if not target.exists():
+        STATIC_DIR.mkdir(exist_ok=True)
+        staging = target.with_name(f'.{filename}.{os.getpid()}')
+        staging.write_bytes(css)
+        os.replace(staging, target)
+        for stale in STATIC_DIR.glob(f'{name}.*.css'):
+            if stale != target:
+                stale.unlink(missing_ok=True)
+    return f'{STATIC_URL}/{filename}'
+
+def serves_css():
+    """Whether this Streamlit serves static stylesheets as text/css"""
+    release = tuple(int(part) for part in re.findall(r'\d+', st.__version__)[:2])
+    return release >= CSS_STATIC_SERVING_SINCE and st.get_option('server.enableStaticServing')
+
+def inject_stylesheet(name):
+    """Link the theme stylesheet into the page
+
+    Only a ``<link>`` tag goes over the websocket on each rerun; the sheet is
+    fetched once and cached by the browser. Without static serving of CSS
+    (see serves_css) or with a read-only app directory the CSS is inlined
+    as before.
+    """
+    if serves_css():
+        try:
+            url = publish_stylesheet(name)
+        except OSError:
+            pass
+        else:
+            st.markdown(f'<link rel="stylesheet" href="{url}">', unsafe_allow_html=True)
+            return
+    st.markdown(f'<style>\n{read_stylesheet(name)}</style>', unsafe_allow_html=True)
@@ -0,0 +1,338 @@
+"""
+Batch runner for Smart Portfolio Builder
+Streams a CSV or Parquet client book through the calculators in vectorized chunks
+
+Usage: python batch.py clients.csv results.csv [--calculators sip,tax] [--chunk-size 100000]
+
+Each calculator runs for every client book that has its input columns (see
+CALCULATORS). Rates are percentages, as entered in the app. Results are
+written chunk by chunk, so memory stays bounded by ``--chunk-size`` whatever
+the size of the book.
+"""
+
+import argparse
+import hashlib
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+import core
+from cache import source_version
+from core import (SCENARIOS, DEFAULT_FISCAL_YEAR, TAX_TABLES, get_risk_profile, RISK_THRESHOLDS,
+                  calculate_sip_batch, calculate_retirement_batch, calculate_tax_batch,
+                  calculate_loan_emi_batch, calculate_portfolio_batch)
+
+DEFAULT_CHUNK_SIZE = 100_000
+PARQUET_SUFFIXES = ('.parquet', '.pq')
+
+# ===== CALCULATORS =====
+
+def _sip(cols, options):
+    return calculate_sip_batch(cols['sip_monthly'], cols['sip_return_pct'] / 100, cols['sip_years'])
+
+def _retirement(cols, options):
+    return calculate_retirement_batch(cols['current_age'], cols['retirement_age'],
+                                      cols['current_savings'], cols['monthly_savings'],
+                                      cols['return_pct'] / 100, cols['inflation_pct'] / 100,
+                                      cols['monthly_expenses'])
+
+def _tax(cols, options):
+    default = options.get('regime') or 'new'
+    regime = cols.get('tax_regime', default)
+    if np.ndim(regime):
+        regime = np.char.lower(np.char.strip(regime.astype(str)))
+        # blank regimes take the run's --regime; anything else but 'old' is taxed
+        # under the new regime, the app's default
+        regime = np.where(np.isin(regime, ('', 'nan', 'none')), default, regime)
+        regime = np.where(regime == 'old', 'old', 'new')
+    return calculate_tax_batch(cols['annual_income'], regime,
+                               options.get('fiscal_year') or DEFAULT_FISCAL_YEAR)
+
+def _emi(cols, options):
+    return calculate_loan_emi_batch(cols['loan_amount'], cols['loan_rate_pct'], cols['loan_years'])
+
+PROFILE_NAMES = np.array([get_risk_profile(score)['name']
+                          for score in RISK_THRESHOLDS + (RISK_THRESHOLDS[-1] + 1,)])
+
+def _portfolio(cols, options):
+    result = calculate_portfolio_batch(cols['monthly_income'], cols['monthly_expenses'],
+                                       cols['risk_score'], cols['initial_investment'],
+                                       cols['monthly_investment'], cols['horizon_years'])
+    output = {key: result[key] for key in ('monthly_savings', 'annual_savings', 'emergency_fund',
+                                           'total_invested')}
+    output['profile'] = PROFILE_NAMES[result['profile']]
+    for i, scenario in enumerate(SCENARIOS):
+        output[f'{scenario}_return'] = result['annual_returns'][:, i]
+        output[f'{scenario}_final_value'] = result['final_values'][:, i]
+    return output
+
+# name -> (required input columns, optional input columns, chunk function)
+CALCULATORS = {
+    'sip': (('sip_monthly', 'sip_return_pct', 'sip_years'), (), _sip),
+    'retirement': (('current_age', 'retirement_age', 'current_savings', 'monthly_savings',
+                    'return_pct', 'inflation_pct', 'monthly_expenses'), (), _retirement),
+    'tax': (('annual_income',), ('tax_regime',), _tax),
+    'emi': (('loan_amount', 'loan_rate_pct', 'loan_years'), (), _emi),
+    'portfolio': (('monthly_income', 'monthly_expenses', 'risk_score', 'initial_investment',
+                   'monthly_investment', 'horizon_years'), (), _portfolio),
+}
+
+# Assumption tables in core and run options each calculator's results depend on
+ASSUMPTIONS = {
+    'retirement': ('LIFE_EXPECTANCY',),
+    'tax': ('TAX_TABLES', 'DEFAULT_FISCAL_YEAR'),
+    'portfolio': ('RETURNS_DATA',),
+}
+OPTIONS = {
+    'tax': ('fiscal_year', 'regime'),
+}
+
+def calculator_version(name, options=None):
+    """Digest of everything a calculator's results depend on besides a client's inputs
+
+    Covers the calculator source (core.py and this module), the assumption
+    tables listed in ASSUMPTIONS and the run options listed in OPTIONS.
+    """
+    options = options or {}
+    tables = tuple(getattr(core, table) for table in ASSUMPTIONS.get(name, ()))
+    settings = tuple(options.get(option) for option in OPTIONS.get(name, ()))
+    payload = repr((name, source_version(core.calculate_sip_batch), source_version(CALCULATORS[name][2]),
+                    tables, settings))
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+def input_fingerprints(frame, name):
+    """Per-client uint64 digest of a calculator's inputs
+
+    Inputs are normalized the way compute_chunk feeds them to the calculator,
+    so the same values hash alike whether read from CSV or Parquet.
+    """
+    import pandas as pd
+
+    required, optional, _ = CALCULATORS[name]
+    inputs = pd.DataFrame({column: frame[column].to_numpy(dtype=float) for column in required})
+    for column in optional:
+        if column in frame:
+            inputs[column] = frame[column].astype(str).to_numpy()
+    return pd.util.hash_pandas_object(inputs, index=False).to_numpy()
+
+def available_calculators(columns):
+    """Calculators whose required inputs are all among ``columns``"""
+    columns = set(columns)
+    return [name for name, (required, _, _) in CALCULATORS.items() if columns.issuperset(required)]
+
+def check_columns(calculators, columns):
+    """Raise ValueError naming the required inputs ``columns`` lacks"""
+    missing = {name: [c for c in CALCULATORS[name][0] if c not in columns] for name in calculators}
+    missing = {name: cols for name, cols in missing.items() if cols}
+    if missing:
+        raise ValueError('missing input columns: ' +
+                         '; '.join(f"{name}: {', '.join(cols)}" for name, cols in missing.items()))
+
+def input_columns(calculators, columns):
+    """Input columns to read for ``calculators``, in file order"""
+    wanted = set()
+    for name in calculators:
+        required, optional, _ = CALCULATORS[name]
+        wanted.update(required, optional)
+    return [column for column in columns if column in wanted]
+
+def column_dtypes(calculators, columns):
+    """CSV dtypes for ``columns``: required calculator inputs as float, the rest as text
+
+    Fixing them up front gives every chunk the same types, where pandas
+    would otherwise infer them afresh (a blank column reads as float).
+    """
+    required = {column for name in calculators for column in CALCULATORS[name][0]}
+    return {column: float if column in required else str for column in columns}
+
+def compute_chunk(frame, calculators, options=None, keep=()):
+    """Run ``calculators`` over a DataFrame of clients
+
+    Returns an ordered dict of output arrays: the ``keep`` columns copied
+    through, then each calculator's results prefixed with its name. Also
+    returns seconds spent per calculator.
+    """
+    options = options or {}
+    output = {column: frame[column].to_numpy() for column in keep}
+    timings = {}
+    for name in calculators:
+        required, optional, function = CALCULATORS[name]
+        cols = {column: frame[column].to_numpy(dtype=float) for column in required}
+        cols.update({column: frame[column].to_numpy() for column in optional if column in frame})
+        start = time.perf_counter()
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            result = function(cols, options)
+        output.update((f'{name}_{key}', np.broadcast_to(value, len(frame)))
+                      for key, value in result.items())
+        timings[name] = time.perf_counter() - start
+    return output, timings
+
+# ===== INPUT / OUTPUT =====
+
+def is_parquet(path):
+    return Path(path).suffix.lower() in PARQUET_SUFFIXES
+
+def read_columns(path):
+    """Column names of a CSV or Parquet client book"""
+    if is_parquet(path):
+        import pyarrow.parquet as pq
+        return pq.ParquetFile(path).schema_arrow.names
+    import pandas as pd
+    return list(pd.read_csv(path, nrows=0).columns)
+
+def read_chunks(path, columns, chunk_size=DEFAULT_CHUNK_SIZE, dtypes=None):
+    """Yield DataFrames of at most ``chunk_size`` rows holding ``columns``
+
+    ``dtypes`` (see column_dtypes) applies to CSV; Parquet carries its own
+    schema. Parquet is decoded a row group at a time, so peak memory there
+    also depends on how the file was written.
+    """
+    if is_parquet(path):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size, columns=columns):
+            yield batch.to_pandas()
+    else:
+        import pandas as pd
+        yield from pd.read_csv(path, usecols=columns, dtype=dtypes, chunksize=chunk_size)
+
+def _arrow_array(values):
+    import pyarrow as pa
+
+    array = pa.array(values, from_pandas=True)
+    # a text column blank throughout the first chunk still has to hold text later
+    return array.cast(pa.string()) if pa.types.is_null(array.type) else array
+
+class ChunkWriter:
+    """Appends result chunks to a CSV or Parquet file
+
+    Chunks go straight from NumPy arrays to Arrow tables; Arrow's CSV writer
+    is an order of magnitude faster than ``DataFrame.to_csv``. The first
+    chunk fixes the schema and later chunks are cast to it. Chunks go to a
+    hidden file beside ``path`` that replaces it only once the writer is
+    closed without error, so a failed run leaves no partial results behind.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.rows = 0
+        self._writer = self._schema = None
+        target = Path(path)
+        self._staging = target.with_name(f'.{target.stem}.{os.getpid()}{target.suffix}')
+
+    def write(self, output):
+        import pyarrow as pa
+
+        table = pa.table({name: _arrow_array(values) for name, values in output.items()})
+        if self._writer is None:
+            self._schema = table.schema
+            if is_parquet(self.path):
+                import pyarrow.parquet as pq
+                self._writer = pq.ParquetWriter(str(self._staging), table.schema)
+            else:
+                import pyarrow.csv as pc
+                self._writer = pc.CSVWriter(str(self._staging), table.schema)
+        else:
+            table = table.cast(self._schema)
+        self._writer.write_table(table)
+        self.rows += table.num_rows
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            os.replace(self._staging, self.path)
+
+    def discard(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            os.remove(self._staging)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+# ===== RUNNER =====
+
+def run(source, destination, calculators=None, chunk_size=DEFAULT_CHUNK_SIZE, options=None,
+        keep=None, progress=None):
+    """Stream ``source`` through the calculators into ``destination``
+
+    Returns a summary with row count, elapsed seconds, rows per second and
+    seconds spent in each calculator. ``progress`` is called with the running
+    summary after every chunk.
+    """
+    columns = read_columns(source)
+    calculators = calculators or available_calculators(columns)
+    check_columns(calculators, columns)
+    keep = [c for c in (keep if keep is not None else ['client_id']) if c in columns]
+    read = list(dict.fromkeys(keep + input_columns(calculators, columns)))
+    dtypes = column_dtypes(calculators, read)
+
+    summary = {'calculators': list(calculators), 'rows': 0, 'chunks': 0, 'seconds': 0.0,
+               'rows_per_second': 0.0, 'calculator_seconds': dict.fromkeys(calculators, 0.0)}
+    start = time.perf_counter()
+    with ChunkWriter(destination) as writer:
+        for frame in read_chunks(source, read, chunk_size, dtypes):
+            output, timings = compute_chunk(frame, calculators, options, keep)
+            writer.write(output)
+            for name, seconds in timings.items():
+                summary['calculator_seconds'][name] += seconds
+            summary['rows'] += len(frame)
+            summary['chunks'] += 1
+            summary['seconds'] = time.perf_counter() - start
+            summary['rows_per_second'] = summary['rows'] / summary['seconds']
+            if progress is not None:
+                progress(summary)
+    summary['seconds'] = time.perf_counter() - start
+    summary['rows_per_second'] = summary['rows'] / summary['seconds'] if summary['seconds'] else 0.0
+    return summary
+
+def _report(summary, stream=sys.stderr):
+    print(f"{summary['rows']:>12,} rows  {summary['seconds']:8.2f}s  "
+          f"{summary['rows_per_second']:>12,.0f} rows/s", file=stream)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the calculators over a CSV or Parquet client book')
+    parser.add_argument('source', help='client inputs (.csv, .parquet)')
+    parser.add_argument('destination', help='results file (.csv, .parquet)')
+    parser.add_argument('--calculators', help=f"comma-separated subset of {', '.join(CALCULATORS)} "
+                                              '(default: every calculator whose inputs are present)')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='rows per chunk')
+    parser.add_argument('--fiscal-year', choices=sorted(TAX_TABLES), help='tax tables to use')
+    parser.add_argument('--regime', choices=('old', 'new'), default='new',
+                        help='tax regime for books without a tax_regime column')
+    parser.add_argument('--keep', default='client_id',
+                        help='comma-separated input columns copied to the results')
+    parser.add_argument('--quiet', action='store_true', help='no per-chunk progress')
+    args = parser.parse_args(argv)
+
+    calculators = args.calculators.split(',') if args.calculators else None
+    unknown = [name for name in calculators or () if name not in CALCULATORS]
+    if unknown:
+        parser.error(f"unknown calculators: {', '.join(unknown)}")
+    try:
+        summary = run(args.source, args.destination, calculators, args.chunk_size,
+                      {'fiscal_year': args.fiscal_year, 'regime': args.regime},
+                      [c for c in args.keep.split(',') if c],
+                      progress=None if args.quiet else _report)
+    except ValueError as exc:
+        parser.error(str(exc))
+
+    print(f"done: {', '.join(summary['calculators'])}", file=sys.stderr)
+    _report(summary)
+    for name, seconds in summary['calculator_seconds'].items():
+        print(f"  {name:<12}{seconds:8.2f}s  {summary['rows'] / seconds if seconds else 0:>14,.0f} rows/s",
+              file=sys.stderr)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
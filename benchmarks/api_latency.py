@@ -0,0 +1,87 @@
+"""
+API latency benchmark
+Round-trip latency of the batch endpoints over one keep-alive connection
+Usage: python benchmarks/api_latency.py [--batch 1000] [--requests 200]
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import api  # noqa: E402
+
+def sample_requests(route, n, rng):
+    """``n`` random request bodies for ``route``"""
+    makers = {
+        '/sip': lambda: {'monthly_sip': rng.randrange(500, 50000), 'annual_return': rng.uniform(0.04, 0.15),
+                         'years': rng.randrange(1, 40)},
+        '/retirement': lambda: {'current_age': rng.randrange(22, 50), 'retirement_age': rng.randrange(55, 65),
+                                'current_savings': rng.randrange(0, 5_000_000),
+                                'monthly_savings': rng.randrange(0, 100_000),
+                                'annual_return': rng.uniform(0.04, 0.14),
+                                'annual_inflation': rng.uniform(0.03, 0.07),
+                                'monthly_expenses': rng.randrange(10_000, 200_000)},
+        '/tax': lambda: {'income': rng.randrange(0, 50_000_000), 'regime': rng.choice(['old', 'new'])},
+        '/emi': lambda: {'principal': rng.randrange(100_000, 10_000_000), 'annual_rate': rng.uniform(6, 14),
+                         'years': rng.randrange(1, 30)},
+        '/mutual-funds': lambda: {'investment': rng.randrange(1000, 1_000_000),
+                                  'annual_return': rng.uniform(0.04, 0.15), 'years': rng.randrange(1, 40),
+                                  'is_sip': rng.random() < 0.5},
+        '/scenarios': lambda: {'portfolio': {'Equity': 50, 'Debt': 30, 'Gold': 12, 'Cash': 8},
+                               'initial': rng.randrange(0, 1_000_000), 'monthly': rng.randrange(0, 50_000),
+                               'years': rng.randrange(1, 40)},
+    }
+    return [makers[route]() for _ in range(n)]
+
+async def _post(reader, writer, path, payload):
+    body = json.dumps(payload).encode()
+    writer.write(f'POST {path} HTTP/1.1\r\nHost: bench\r\nContent-Type: application/json\r\n'
+                 f'Content-Length: {len(body)}\r\n\r\n'.encode() + body)
+    await writer.drain()
+    headers = {}
+    status = (await reader.readline()).split()[1]
+    while (line := await reader.readline()) not in (b'\r\n', b''):
+        name, _, value = line.decode().partition(':')
+        headers[name.lower()] = value.strip()
+    await reader.readexactly(int(headers['content-length']))
+    if status != b'200':
+        raise RuntimeError(f'{path} answered {status.decode()}')
+    return float(headers['server-timing'].split('dur=')[1])
+
+async def run(batch, requests):
+    server = await asyncio.start_server(api.handle_connection, '127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    rng = random.Random(0)
+    print(f"{'endpoint':<22}{'p50':>10}{'p95':>10}{'server p50':>12}")
+    for route in api.ENDPOINTS:
+        payload = {'requests': sample_requests(route, batch, rng)}
+        latencies, compute = [], []
+        for _ in range(requests):
+            start = time.perf_counter()
+            compute.append(await _post(reader, writer, route + '/batch', payload))
+            latencies.append((time.perf_counter() - start) * 1000)
+        latencies.sort()
+        print(f"{route + '/batch':<22}{statistics.median(latencies):>8.2f}ms"
+              f"{latencies[int(0.95 * len(latencies))]:>8.2f}ms{statistics.median(compute):>10.2f}ms")
+    writer.close()
+    await writer.wait_closed()
+    server.close()
+    await server.wait_closed()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--batch', type=int, default=1000, help='requests per batch')
+    parser.add_argument('--requests', type=int, default=200, help='batches per endpoint')
+    args = parser.parse_args(argv)
+    asyncio.run(run(args.batch, args.requests))
+
+if __name__ == '__main__':
+    main()
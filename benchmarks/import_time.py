@@ -0,0 +1,50 @@
+"""
+Startup benchmark
+Cold import time of each module, measured in a fresh interpreter per run
+Usage: python benchmarks/import_time.py [--runs N] [module ...]
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# (label, statement) pairs timed after interpreter start-up
+TARGETS = {
+    'numpy': 'import numpy',
+    'cache': 'import cache',
+    'core': 'import core',
+    'utils': 'import utils',
+    'simulation': 'import simulation',
+    'utils+chart': "import utils; utils.create_allocation_chart({'Equity': 1})",
+}
+
+PROBE = ('import time; t = time.perf_counter(); {stmt}; '
+         'print((time.perf_counter() - t) * 1000)')
+
+def time_import(statement, runs):
+    """Wall-clock milliseconds of ``statement`` in ``runs`` fresh interpreters"""
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, '-c', PROBE.format(stmt=statement)],
+                             cwd=ROOT, capture_output=True, text=True, check=True)
+        samples.append(float(out.stdout.strip()))
+    return samples
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('modules', nargs='*', default=list(TARGETS), help='targets to time')
+    parser.add_argument('--runs', type=int, default=7, help='fresh interpreters per target')
+    args = parser.parse_args(argv)
+
+    print(f"{'target':<14}{'median':>10}{'min':>10}{'max':>10}")
+    for name in args.modules:
+        samples = time_import(TARGETS.get(name, f'import {name}'), args.runs)
+        print(f"{name:<14}{statistics.median(samples):>8.1f}ms{min(samples):>8.1f}ms"
+              f"{max(samples):>8.1f}ms")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+"""
+Instrumentation overhead benchmark
+Per-call cost of spans and timed calculators with recording off and on
+Usage: python benchmarks/instrumentation_overhead.py [--calls N]
+"""
+
+import argparse
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import instrumentation  # noqa: E402
+from core import calculate_sip  # noqa: E402
+
+def per_call_ns(statement, calls, namespace):
+    """Best-of-5 nanoseconds per execution of ``statement``"""
+    return min(timeit.repeat(statement, number=calls, repeat=5, globals=namespace)) / calls * 1e9
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--calls', type=int, default=200_000, help='executions per measurement')
+    args = parser.parse_args(argv)
+
+    raw_sip = calculate_sip.__wrapped__  # the cached calculator without its span
+    calculate_sip(5000, 0.12, 10)  # warm the cache: we time the hit path
+    namespace = {'span': instrumentation.span, 'calculate_sip': calculate_sip, 'raw_sip': raw_sip}
+    statements = {
+        'empty span': 'with span("bench"): pass',
+        'cached calculate_sip': 'calculate_sip(5000, 0.12, 10)',
+    }
+    baseline = {'empty span': 'pass', 'cached calculate_sip': 'raw_sip(5000, 0.12, 10)'}
+
+    print(f"{'target':<24}{'bare ns':>10}{'off ns':>10}{'on ns':>10}")
+    for label, statement in statements.items():
+        bare = per_call_ns(baseline[label], args.calls, namespace)
+        instrumentation.enable(False)
+        off = per_call_ns(statement, args.calls, namespace)
+        instrumentation.enable(True)
+        on = per_call_ns(statement, args.calls, namespace)
+        instrumentation.enable(False)
+        print(f'{label:<24}{bare:>10.0f}{off:>10.0f}{on:>10.0f}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+"""
+Per-rerun payload benchmark
+Serialized size of the elements a full rerun sends, with the theme linked vs inlined
+Usage: python benchmarks/rerun_payload.py
+"""
+
+import sys
+from pathlib import Path
+
+from streamlit import config
+from streamlit.testing.v1 import AppTest
+
+ROOT = Path(__file__).resolve().parent.parent
+
+def payload_bytes(node):
+    """Serialized size of every element under ``node``"""
+    proto = getattr(node, 'proto', None)
+    if proto is not None and not hasattr(node, 'children'):
+        return proto.ByteSize()
+    return sum(payload_bytes(child) for child in getattr(node, 'children', {}).values())
+
+def measure(script, static_serving):
+    config.set_option('server.enableStaticServing', static_serving)
+    at = AppTest.from_file(str(ROOT / script), default_timeout=60).run()
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+    return payload_bytes(at._tree)
+
+def main(scripts):
+    print(f"{'script':<10}{'inline CSS':>14}{'linked CSS':>14}{'saved':>10}")
+    for script in scripts:
+        inline = measure(script, False)
+        linked = measure(script, True)
+        print(f"{script:<10}{inline:>12,} B{linked:>12,} B{1 - linked / inline:>10.1%}")
+
+if __name__ == '__main__':
+    main(sys.argv[1:] or ['app.py', 'main.py'])
@@ -0,0 +1,468 @@
+"""
+Result caching for Smart Portfolio Builder
+Process-wide, thread-safe LRU cache and single-flight for calculator results
+"""
+
+import asyncio
+import functools
+import hashlib
+import inspect
+import numbers
+import os
+import pickle
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# ===== KEYS =====
+
+def _canonical(value):
+    """Hashable, type-normalized form of an argument (10 and 10.0 map to the same key)"""
+    if value is None or isinstance(value, (bool, str)):
+        return value
+    if isinstance(value, numbers.Number) or isinstance(value, np.number):
+        return float(value)
+    if isinstance(value, np.ndarray):
+        digest = hashlib.sha1(np.ascontiguousarray(value).tobytes()).hexdigest()
+        return ('ndarray', value.dtype.str, value.shape, digest)
+    if isinstance(value, dict):
+        return ('dict', tuple(sorted((str(k), _canonical(v)) for k, v in value.items())))
+    if isinstance(value, (list, tuple)):
+        return ('seq', tuple(_canonical(v) for v in value))
+    raise TypeError(f"cannot build a cache key from {type(value).__name__}")
+
+def canonical_key(func, args, kwargs, signature=None):
+    """Cache key for a call: function identity plus its bound, defaulted arguments"""
+    bound = (signature or inspect.signature(func)).bind(*args, **kwargs)
+    bound.apply_defaults()
+    return (func.__module__, func.__qualname__,
+            tuple((name, _canonical(value)) for name, value in bound.arguments.items()))
+
+# ===== SIZE ESTIMATION =====
+
+def _estimate_size(value, _seen=None):
+    """Approximate retained bytes of a result (arrays, containers and plain objects)"""
+    seen = _seen if _seen is not None else set()
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    if isinstance(value, np.ndarray):
+        if isinstance(value.base, np.ndarray):
+            return sys.getsizeof(value) + _estimate_size(value.base, seen)
+        return sys.getsizeof(value) + value.nbytes
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(_estimate_size(k, seen) + _estimate_size(v, seen) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set)):
+        size += sum(_estimate_size(v, seen) for v in value)
+    elif hasattr(value, '__dict__'):
+        size += _estimate_size(vars(value), seen)
+    return size
+
+# ===== LRU CACHE =====
+
+class ResultCache:
+    """Thread-safe LRU cache bounded by the estimated size of its values"""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """(found, value) for ``key``, marking it most recently used"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[0]
+
+    def peek(self, key):
+        """(found, value) for ``key`` without touching recency or counters"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return (False, None) if entry is None else (True, entry[0])
+
+    def put(self, key, value):
+        size = _estimate_size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+CACHE = ResultCache()
+
+# ===== SINGLE-FLIGHT =====
+
+class _Flight:
+    __slots__ = ('done', 'value', 'error', 'followers', 'future')
+
+    def __init__(self, future=None):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+        self.followers = 0
+        self.future = future  # resolved alongside ``done`` for flights led by a coroutine
+
+class SingleFlight:
+    """Collapse concurrent calls with the same key into one execution
+
+    The first caller for a key runs the computation; callers arriving while it
+    is in flight block until it finishes and receive the same result (or
+    exception). Nothing is retained afterwards, so this bounds concurrent work
+    to the number of distinct keys without caching anything by itself.
+
+    Exceptions that concern the leader rather than the computation (e.g. its
+    request being refused admission) can be kept from followers by passing
+    their types as ``unshared``: followers then retry, one of them leading.
+    do_async() is the same for coroutines on an event loop, whose followers
+    wait without holding a thread.
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.coalesced = 0
+
+    def do(self, key, func, *args, unshared=(), **kwargs):
+        """(value, shared) for ``func(*args, **kwargs)``, joining an identical call in flight"""
+        while True:
+            with self._lock:
+                flight = self._flights.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._flights[key] = _Flight()
+                    self.executions += 1
+                else:
+                    flight.followers += 1
+                    self.coalesced += 1
+            if leader:
+                break
+            flight.done.wait()
+            if flight.error is None:
+                return flight.value, True
+            if not isinstance(flight.error, unshared):
+                raise flight.error
+        try:
+            flight.value = func(*args, **kwargs)
+        except BaseException as exc:
+            flight.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.value, False
+
+    async def do_async(self, key, func, *args, unshared=(), **kwargs):
+        """(value, shared) for ``await func(*args, **kwargs)``, joining an identical call in flight
+
+        A leader that is cancelled does not cancel its followers: they retry.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                flight = self._flights.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._flights[key] = _Flight(loop.create_future())
+                    self.executions += 1
+                else:
+                    flight.followers += 1
+                    self.coalesced += 1
+            if leader:
+                break
+            if flight.future is not None:
+                await asyncio.shield(flight.future)
+            else:
+                await asyncio.to_thread(flight.done.wait)
+            if flight.error is None:
+                return flight.value, True
+            if not isinstance(flight.error, (asyncio.CancelledError,) + tuple(unshared)):
+                raise flight.error
+        try:
+            flight.value = await func(*args, **kwargs)
+        except BaseException as exc:
+            flight.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+            flight.future.set_result(None)
+        return flight.value, False
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._flights)
+
+    def clear(self):
+        """Reset the counters (flights in progress are unaffected)"""
+        with self._lock:
+            self.executions = self.coalesced = 0
+
+    def stats(self):
+        with self._lock:
+            calls = self.executions + self.coalesced
+            return {
+                'executions': self.executions,
+                'coalesced': self.coalesced,
+                'in_flight': len(self._flights),
+                'waiting': sum(f.followers for f in self._flights.values()),
+                'coalesce_rate': self.coalesced / calls if calls else 0.0
+            }
+
+FLIGHTS = SingleFlight()
+
+# ===== PERSISTENT CACHE =====
+
+class PersistentCache:
+    """SQLite-backed result store that survives restarts
+
+    Entries expire ``ttl`` seconds after they were written, and the least
+    recently read entries are dropped once stored values exceed ``max_bytes``.
+    Several processes may share one database file.
+    """
+
+    def __init__(self, path, ttl=7 * 24 * 3600, max_bytes=256 * 1024 * 1024):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS results ('
+            'key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, '
+            'created REAL NOT NULL, accessed REAL NOT NULL)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed)')
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.purge_expired()
+
+    @staticmethod
+    def _digest(key):
+        return hashlib.sha256(repr(key).encode()).hexdigest()
+
+    def get(self, key):
+        """(found, value) for ``key``; expired entries count as misses and are deleted"""
+        digest = self._digest(key)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute('SELECT value, created FROM results WHERE key = ?',
+                                     (digest,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return False, None
+            if now - row[1] > self.ttl:
+                self._conn.execute('DELETE FROM results WHERE key = ?', (digest,))
+                self._conn.commit()
+                self.expired += 1
+                self.misses += 1
+                return False, None
+            self._conn.execute('UPDATE results SET accessed = ? WHERE key = ?', (now, digest))
+            self._conn.commit()
+            self.hits += 1
+        return True, pickle.loads(row[0])
+
+    def put(self, key, value):
+        try:
+            blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, TypeError, AttributeError):
+            return
+        if len(blob) > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)',
+                               (self._digest(key), blob, len(blob), now, now))
+            total = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM results').fetchone()[0]
+            while total > self.max_bytes:
+                oldest = self._conn.execute(
+                    'SELECT key, size FROM results ORDER BY accessed LIMIT 64').fetchall()
+                self._conn.executemany('DELETE FROM results WHERE key = ?',
+                                       [(k,) for k, _ in oldest])
+                total -= sum(size for _, size in oldest)
+            self._conn.commit()
+
+    def purge_expired(self):
+        with self._lock:
+            self._conn.execute('DELETE FROM results WHERE created < ?', (time.time() - self.ttl,))
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute('DELETE FROM results')
+            self._conn.commit()
+            self.hits = self.misses = self.expired = 0
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results').fetchone()
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'expired': self.expired,
+                'entries': entries,
+                'bytes': size,
+                'max_bytes': self.max_bytes,
+                'ttl': self.ttl
+            }
+
+PERSISTENT = None
+
+def configure_persistent_cache(path, ttl=7 * 24 * 3600, max_bytes=256 * 1024 * 1024):
+    """Enable (or, with ``path=None``, disable) the on-disk tier under the calculators"""
+    global PERSISTENT
+    PERSISTENT = PersistentCache(path, ttl, max_bytes) if path else None
+    return PERSISTENT
+
+if os.environ.get('SPB_CACHE_DB'):
+    configure_persistent_cache(os.environ['SPB_CACHE_DB'],
+                               ttl=float(os.environ.get('SPB_CACHE_TTL', 7 * 24 * 3600)),
+                               max_bytes=int(os.environ.get('SPB_CACHE_MAX_BYTES', 256 * 1024 * 1024)))
+
+# ===== DECORATOR =====
+
+def source_version(func):
+    """Digest of the source of the module defining ``func``"""
+    module = sys.modules.get(func.__module__)
+    try:
+        source = inspect.getsource(module) if module is not None else ''
+    except (OSError, TypeError):
+        source = func.__code__.co_code.hex()
+    return hashlib.sha1(source.encode()).hexdigest()
+
+def _share(value):
+    """Hand out a shallow copy of dict results so callers can add keys safely"""
+    return dict(value) if isinstance(value, dict) else value
+
+def cached(func=None, *, cache=None, assumptions=()):
+    """Memoize a calculator in the process-wide cache, keyed on canonicalized inputs
+
+    Keys are versioned by the source of the calculator's module and by the
+    module globals named in ``assumptions`` (e.g. ``'TAX_TABLES'``), so
+    edited code or updated tables never serve stale results. The tables are
+    digested once per object: rebinding a global is noticed on the next
+    call, while a table edited in place needs ``wrapper.invalidate()``. On a
+    memory miss the on-disk tier is consulted when configured,
+    and concurrent misses for the same key share one computation (FLIGHTS).
+
+    Calls whose arguments cannot be canonicalized go straight to the function.
+    Cached results are shared between callers and sessions: treat them (and
+    any arrays inside them) as read-only.
+    """
+    if func is None:
+        return functools.partial(cached, cache=cache, assumptions=assumptions)
+
+    store = cache or CACHE
+    signature = inspect.signature(func)
+    code_version = []
+    digested = [None]  # (table objects, digest of their repr)
+
+    def version():
+        if not code_version:
+            code_version.append(source_version(func))
+        module_globals = func.__globals__
+        tables = tuple(module_globals[name] for name in assumptions)
+        current = digested[0]
+        if current is None or any(table is not seen for table, seen in zip(tables, current[0])):
+            current = digested[0] = (tables, hashlib.sha1(repr(tables).encode()).hexdigest())
+        return code_version[0], current[1]
+
+    def invalidate():
+        """Re-digest the assumption tables on the next call, after editing one in place"""
+        digested[0] = None
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            key = (version(),) + canonical_key(func, args, kwargs, signature)
+        except TypeError:
+            return func(*args, **kwargs)
+        found, value = store.get(key)
+        if not found:
+            value, _ = FLIGHTS.do(key, fill, key, args, kwargs)
+        return _share(value)
+
+    def fill(key, args, kwargs):
+        # A flight that finished between our miss and joining left its result here
+        found, value = store.peek(key)
+        if found:
+            return value
+        persistent = PERSISTENT
+        if persistent is not None:
+            found, value = persistent.get(key)
+        if not found:
+            value = func(*args, **kwargs)
+            if persistent is not None:
+                persistent.put(key, value)
+        store.put(key, value)
+        return value
+
+    wrapper.cache = store
+    wrapper.invalidate = invalidate
+    return wrapper
+
+def coalesced(func):
+    """Share one execution of ``func`` between identical concurrent calls
+
+    For computations too large or too random to memoize (Monte Carlo runs):
+    nothing is stored, but callers that arrive while an identical call is in
+    flight wait for it instead of repeating it. Arguments that cannot be
+    canonicalized bypass coalescing.
+    """
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            key = ('coalesced',) + canonical_key(func, args, kwargs, signature)
+        except TypeError:
+            return func(*args, **kwargs)
+        value, _ = FLIGHTS.do(key, func, *args, **kwargs)
+        return _share(value)
+
+    return wrapper
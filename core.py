@@ -0,0 +1,756 @@
+"""
+Calculation core for Smart Portfolio Builder
+Calculators and formatting helpers that depend only on NumPy
+"""
+
+import numpy as np
+
+from cache import cached
+from instrumentation import timed
+
+# ===== FORMATTING FUNCTIONS =====
+
+def format_currency(value):
+    """Format number as Indian currency"""
+    if value >= 1_00_00_000:
+        return f"₹{value / 1_00_00_000:.2f} Cr"
+    elif value >= 1_00_000:
+        return f"₹{value / 1_00_000:.2f} L"
+    else:
+        return f"₹{value:,.0f}"
+
+def format_percentage(value):
+    """Format as percentage"""
+    return f"{value:.2f}%"
+
+# ===== PORTFOLIO FUNCTIONS =====
+
+def get_risk_profile(risk_score):
+    """Get portfolio profile based on risk score"""
+    if risk_score <= 8:
+        return {
+            'name': 'Capital Protector',
+            'emoji': '🛡️',
+            'color': '#10B981',
+            'allocation': {'Equity': 25, 'Debt': 55, 'Gold': 12, 'Cash': 8}
+        }
+    elif risk_score <= 14:
+        return {
+            'name': 'Growth Seeker',
+            'emoji': '⚖️',
+            'color': '#F59E0B',
+            'allocation': {'Equity': 50, 'Debt': 30, 'Gold': 12, 'Cash': 8}
+        }
+    elif risk_score <= 18:
+        return {
+            'name': 'Growth Investor',
+            'emoji': '📈',
+            'color': '#EF4444',
+            'allocation': {'Equity': 70, 'Debt': 15, 'Gold': 10, 'Cash': 5}
+        }
+    else:
+        return {
+            'name': 'Wealth Builder',
+            'emoji': '🚀',
+            'color': '#8B5CF6',
+            'allocation': {'Equity': 85, 'Debt': 8, 'Gold': 5, 'Cash': 2}
+        }
+
+def calculate_portfolio_metrics(income, expenses, savings_rate=0.5):
+    """Calculate financial metrics"""
+    monthly_savings = income - expenses
+    annual_savings = monthly_savings * 12
+    emergency_fund = expenses * 6
+    total_investable = savings_rate * annual_savings
+    
+    return {
+        'monthly_savings': max(0, monthly_savings),
+        'annual_savings': max(0, annual_savings),
+        'emergency_fund': max(0, emergency_fund),
+        'total_investable': max(0, total_investable)
+    }
+
+class WealthProjection:
+    """Wealth time series backed by a contiguous float array
+
+    ``values[i]`` is the portfolio value ``i * step`` months from the start.
+    Resampling to yearly points is a strided view (no copy), and ``years`` /
+    ``values`` can be handed straight to Plotly. Indexing and iteration still
+    yield the old ``{'month', 'year', 'value'}`` dicts.
+    """
+
+    def __init__(self, values, step=1):
+        self.values = values
+        self.step = step
+
+    @property
+    def months(self):
+        return np.arange(len(self.values)) * self.step
+
+    @property
+    def years(self):
+        return self.months / 12
+
+    @property
+    def final_value(self):
+        return float(self.values[-1])
+
+    def resample(self, step):
+        """View sampled every ``step`` months (must be a multiple of the current step)"""
+        if step % self.step:
+            raise ValueError('resample step must be a multiple of the current step')
+        return WealthProjection(self.values[::step // self.step], step)
+
+    def yearly(self):
+        return self.resample(12)
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self.values)
+        if not 0 <= index < len(self.values):
+            raise IndexError('projection index out of range')
+        month = index * self.step
+        return {'month': month, 'year': month / 12, 'value': float(self.values[index])}
+
+    def __iter__(self):
+        for index in range(len(self.values)):
+            yield self[index]
+
+def _projection_values(initial, monthly, monthly_rate, months):
+    """Closed-form balance with end-of-month contributions, broadcast over rates and months
+
+    value(m) = initial * (1 + r)^m + monthly * ((1 + r)^m - 1) / r
+    """
+    monthly_rate = np.asarray(monthly_rate, dtype=float)
+    growth_minus_one = np.expm1(months * np.log1p(monthly_rate))
+    zero_rate = monthly_rate == 0
+    safe_rate = np.where(zero_rate, 1.0, monthly_rate)
+    return np.where(zero_rate,
+                    initial + monthly * months,
+                    initial + growth_minus_one * (initial + monthly / safe_rate))
+
+@timed('calc.wealth_projection')
+@cached
+def calculate_wealth_projection(initial, monthly, annual_return, years):
+    """Calculate wealth projection over time"""
+    months = np.arange(years * 12 + 1, dtype=float)
+    return WealthProjection(_projection_values(initial, monthly, annual_return / 12, months))
+
+# Annual return assumptions per asset class and scenario
+RETURNS_DATA = {
+    'Equity': {'worst': 0.04, 'expected': 0.10, 'best': 0.16},
+    'Debt': {'worst': 0.05, 'expected': 0.07, 'best': 0.08},
+    'Gold': {'worst': 0.03, 'expected': 0.06, 'best': 0.09},
+    'Cash': {'worst': 0.02, 'expected': 0.03, 'best': 0.04}
+}
+
+ASSET_CLASSES = tuple(RETURNS_DATA)
+SCENARIOS = ('worst', 'expected', 'best')
+
+def allocation_weights(portfolio):
+    """Allocation percentages as a weight vector ordered like ASSET_CLASSES"""
+    return np.array([portfolio.get(asset, 0) / 100 for asset in ASSET_CLASSES])
+
+def scenario_return_matrix(scenarios=SCENARIOS):
+    """(assets x scenarios) matrix of annual returns from RETURNS_DATA"""
+    return np.array([[RETURNS_DATA[asset][scenario] for scenario in scenarios]
+                     for asset in ASSET_CLASSES])
+
+def scenario_fan_returns(n):
+    """(assets x n) returns spread from worst through expected to best, piecewise-linearly"""
+    table = scenario_return_matrix()
+    positions = np.linspace(0, len(SCENARIOS) - 1, n)
+    return np.array([np.interp(positions, np.arange(len(SCENARIOS)), row) for row in table])
+
+def calculate_scenario_matrix(portfolio, initial, monthly, years, asset_returns=None):
+    """Project any number of scenarios in one broadcasted pass
+
+    ``asset_returns`` is an (assets x scenarios) matrix of annual returns
+    ordered like ASSET_CLASSES (defaults to worst/expected/best). Blended
+    returns are ``weights @ asset_returns`` and ``projections`` is a
+    (scenarios x months + 1) array.
+    """
+    if asset_returns is None:
+        asset_returns = scenario_return_matrix()
+    annual_returns = allocation_weights(portfolio) @ np.asarray(asset_returns, dtype=float)
+    months = np.arange(years * 12 + 1, dtype=float)
+    projections = _projection_values(initial, monthly, annual_returns[:, None] / 12, months)
+    total_invested = initial + (monthly * years * 12)
+    final_values = projections[:, -1]
+    
+    return {
+        'annual_returns': annual_returns,
+        'projections': projections,
+        'final_values': final_values,
+        'total_invested': total_invested,
+        'gains': final_values - total_invested
+    }
+
+@timed('calc.scenarios')
+@cached(assumptions=('RETURNS_DATA',))
+def calculate_scenarios(portfolio, initial, monthly, years):
+    """Calculate 3 scenarios"""
+    matrix = calculate_scenario_matrix(portfolio, initial, monthly, years)
+    
+    scenarios = {}
+    for i, scenario in enumerate(SCENARIOS):
+        projections = WealthProjection(matrix['projections'][i])
+        final_value = projections.final_value
+        
+        scenarios[scenario] = {
+            'annual_return': float(matrix['annual_returns'][i]),
+            'final_value': final_value,
+            'total_invested': matrix['total_invested'],
+            'gain': final_value - matrix['total_invested'],
+            'projections': projections
+        }
+    
+    return scenarios
+
+def calculate_scenario_batch(weights, initial, monthly, years):
+    """Worst/expected/best outcomes for many portfolios in one broadcasted pass
+
+    ``weights`` is an (..., assets) array of allocation weights ordered like
+    ASSET_CLASSES. ``annual_returns`` and ``final_values`` carry one entry per
+    scenario, in SCENARIOS order, on a trailing axis.
+    """
+    initial = np.asarray(initial, dtype=float)
+    monthly = np.asarray(monthly, dtype=float)
+    months = np.asarray(years, dtype=float) * 12
+    annual_returns = np.asarray(weights, dtype=float) @ scenario_return_matrix()
+    final_values = _projection_values(initial[..., None], monthly[..., None], annual_returns / 12,
+                                      months[..., None])
+    total_invested = initial + monthly * months
+
+    return {
+        'annual_returns': annual_returns,
+        'final_values': final_values,
+        'total_invested': total_invested,
+        'gains': final_values - total_invested[..., None]
+    }
+
+# Highest risk score of each get_risk_profile tier but the last
+RISK_THRESHOLDS = (8, 14, 18)
+
+def calculate_portfolio_batch(income, expenses, risk_score, initial, monthly, years):
+    """Savings, risk profile and scenario outcomes for arrays of clients (broadcast)
+
+    ``profile`` is the get_risk_profile tier index (0 = Capital Protector to
+    3 = Wealth Builder). ``annual_returns`` and ``final_values`` carry one
+    entry per scenario, in SCENARIOS order, on a trailing axis.
+    """
+    income = np.asarray(income, dtype=float)
+    expenses = np.asarray(expenses, dtype=float)
+
+    monthly_savings = np.maximum(0, income - expenses)
+    profile = np.searchsorted(RISK_THRESHOLDS, np.asarray(risk_score, dtype=float))
+    tiers = RISK_THRESHOLDS + (RISK_THRESHOLDS[-1] + 1,)
+    tier_weights = np.array([allocation_weights(get_risk_profile(score)['allocation']) for score in tiers])
+    scenarios = calculate_scenario_batch(tier_weights[profile], initial, monthly, years)
+
+    return {
+        'monthly_savings': monthly_savings,
+        'annual_savings': monthly_savings * 12,
+        'emergency_fund': np.maximum(0, expenses * 6),
+        'profile': profile,
+        'annual_returns': scenarios['annual_returns'],
+        'total_invested': scenarios['total_invested'],
+        'final_values': scenarios['final_values']
+    }
+
+def generate_insights(metrics, profile, scenarios):
+    """Generate actionable insights"""
+    insights = []
+    
+    if metrics['monthly_savings'] > 0:
+        insights.append({
+            'icon': '💰',
+            'title': 'Excellent Savings Rate',
+            'message': f"₹{metrics['monthly_savings']:,.0f} per month saved",
+            'type': 'success'
+        })
+    else:
+        insights.append({
+            'icon': '⚠️',
+            'title': 'No Savings',
+            'message': 'Income equals or is less than expenses',
+            'type': 'warning'
+        })
+    
+    if metrics['emergency_fund'] > 0:
+        insights.append({
+            'icon': '🛡️',
+            'title': 'Emergency Fund Target',
+            'message': f"₹{metrics['emergency_fund']:,.0f} for 6 months",
+            'type': 'info'
+        })
+    
+    expected_gain = scenarios['expected']['gain']
+    if expected_gain > 0:
+        insights.append({
+            'icon': '📈',
+            'title': 'Expected Wealth Growth',
+            'message': f"₹{expected_gain:,.0f} gain in expected scenario",
+            'type': 'success'
+        })
+    
+    best_gain = scenarios['best']['gain']
+    insights.append({
+        'icon': '🚀',
+        'title': 'Best Case Scenario',
+        'message': f"₹{best_gain:,.0f} potential gain",
+        'type': 'info'
+    })
+    
+    return insights
+
+# ===== SIP CALCULATOR =====
+
+def _annuity_due_factor(monthly_rate, months):
+    """Closed-form sum of (1 + r) ** k for k = 1..months (annuity-due FV factor)"""
+    monthly_rate = np.asarray(monthly_rate, dtype=float)
+    months = np.asarray(months, dtype=float)
+    growth_minus_one = np.expm1(months * np.log1p(monthly_rate))
+    zero_rate = monthly_rate == 0
+    safe_rate = np.where(zero_rate, 1.0, monthly_rate)
+    return np.where(zero_rate, months, growth_minus_one / safe_rate * (1 + monthly_rate))
+
+def calculate_sip_batch(monthly_sip, annual_return, years):
+    """Calculate SIP returns for scalars or NumPy arrays of inputs (broadcast)"""
+    monthly_sip = np.asarray(monthly_sip, dtype=float)
+    months = np.asarray(years, dtype=float) * 12
+    monthly_rate = np.asarray(annual_return, dtype=float) / 12
+
+    total_invested = monthly_sip * months
+    final_value = monthly_sip * _annuity_due_factor(monthly_rate, months)
+    gain = final_value - total_invested
+
+    invested_positive = total_invested > 0
+    safe_invested = np.where(invested_positive, total_invested, 1.0)
+    gain_percentage = np.where(invested_positive, gain / safe_invested * 100, 0.0)
+
+    return {
+        'total_invested': total_invested,
+        'final_value': final_value,
+        'gain': gain,
+        'gain_percentage': gain_percentage
+    }
+
+@timed('calc.sip')
+@cached
+def calculate_sip(monthly_sip, annual_return, years):
+    """Calculate SIP returns"""
+    result = calculate_sip_batch(monthly_sip, annual_return, years)
+    return {key: float(value) for key, value in result.items()}
+
+# ===== RETIREMENT CALCULATOR =====
+
+LIFE_EXPECTANCY = 85
+
+def calculate_retirement_batch(current_age, retirement_age, current_savings, monthly_savings,
+                               annual_return, annual_inflation, monthly_expenses):
+    """Calculate retirement corpus for scalars or NumPy arrays of inputs (broadcast)"""
+    current_age = np.asarray(current_age, dtype=float)
+    retirement_age = np.asarray(retirement_age, dtype=float)
+    current_savings = np.asarray(current_savings, dtype=float)
+    monthly_savings = np.asarray(monthly_savings, dtype=float)
+    annual_return = np.asarray(annual_return, dtype=float)
+    annual_inflation = np.asarray(annual_inflation, dtype=float)
+    monthly_expenses = np.asarray(monthly_expenses, dtype=float)
+
+    years_to_retirement = retirement_age - current_age
+    years_in_retirement = LIFE_EXPECTANCY - retirement_age
+    
+    # Calculate corpus needed
+    monthly_in_retirement = monthly_expenses * ((1 + annual_inflation) ** years_to_retirement)
+    total_needed = monthly_in_retirement * 12 * years_in_retirement
+    
+    # Calculate future value of current savings and SIP
+    monthly_rate = annual_return / 12
+    months = years_to_retirement * 12
+    
+    # FV of current savings
+    fv_current = current_savings * ((1 + monthly_rate) ** months)
+    
+    # FV of SIP (no contributions once retirement age has been reached)
+    fv_sip = monthly_savings * _annuity_due_factor(monthly_rate, np.maximum(months, 0))
+    
+    total_corpus = fv_current + fv_sip
+    shortfall = np.maximum(0, total_needed - total_corpus)
+    
+    return {
+        'corpus_needed': total_needed,
+        'corpus_projected': total_corpus,
+        'shortfall': shortfall,
+        'monthly_needed': monthly_in_retirement,
+        'sufficient': total_corpus >= total_needed
+    }
+
+def calculate_retirement_grid(current_age, retirement_age, current_savings, monthly_savings,
+                              annual_return, annual_inflation, monthly_expenses):
+    """Evaluate retirement over the outer product of every 1-D array argument
+
+    Each argument passed as a 1-D array becomes its own axis, in argument order,
+    so ``calculate_retirement_grid(30, ages, 5e5, 1e4, returns, 0.05, 5e4)``
+    returns arrays of shape ``(len(ages), len(returns))``.
+    """
+    args = [np.asarray(arg, dtype=float) for arg in (current_age, retirement_age, current_savings,
+                                                       monthly_savings, annual_return,
+                                                       annual_inflation, monthly_expenses)]
+    n_axes = sum(arg.ndim == 1 for arg in args)
+    axis = 0
+    for i, arg in enumerate(args):
+        if arg.ndim == 1:
+            shape = [1] * n_axes
+            shape[axis] = arg.size
+            args[i] = arg.reshape(shape)
+            axis += 1
+    return calculate_retirement_batch(*args)
+
+@timed('calc.retirement')
+@cached(assumptions=('LIFE_EXPECTANCY',))
+def calculate_retirement(current_age, retirement_age, current_savings, monthly_savings, 
+                        annual_return, annual_inflation, monthly_expenses):
+    """Calculate retirement corpus needed"""
+    result = calculate_retirement_batch(current_age, retirement_age, current_savings,
+                                        monthly_savings, annual_return, annual_inflation,
+                                        monthly_expenses)
+    return {key: (bool(value) if key == 'sufficient' else float(value))
+            for key, value in result.items()}
+
+# ===== TAX CALCULATOR =====
+
+# Per fiscal year and regime: slabs as (lower bound, marginal rate), section 87A
+# rebate, surcharge as (income threshold, rate) and health & education cess.
+TAX_TABLES = {
+    'FY2023-24': {
+        'old': {
+            'slabs': [(0, 0.00), (250000, 0.05), (500000, 0.20), (1000000, 0.30)],
+            'rebate_limit': 500000,
+            'rebate_max': 12500,
+            'rebate_marginal_relief': False,
+            'surcharge': [(5000000, 0.10), (10000000, 0.15), (20000000, 0.25), (50000000, 0.37)],
+            'cess': 0.04
+        },
+        'new': {
+            'slabs': [(0, 0.00), (300000, 0.05), (600000, 0.10), (900000, 0.15),
+                      (1200000, 0.20), (1500000, 0.30)],
+            'rebate_limit': 700000,
+            'rebate_max': 25000,
+            'rebate_marginal_relief': True,
+            'surcharge': [(5000000, 0.10), (10000000, 0.15), (20000000, 0.25)],
+            'cess': 0.04
+        }
+    },
+    'FY2024-25': {
+        'old': {
+            'slabs': [(0, 0.00), (250000, 0.05), (500000, 0.20), (1000000, 0.30)],
+            'rebate_limit': 500000,
+            'rebate_max': 12500,
+            'rebate_marginal_relief': False,
+            'surcharge': [(5000000, 0.10), (10000000, 0.15), (20000000, 0.25), (50000000, 0.37)],
+            'cess': 0.04
+        },
+        'new': {
+            'slabs': [(0, 0.00), (300000, 0.05), (700000, 0.10), (1000000, 0.15),
+                      (1200000, 0.20), (1500000, 0.30)],
+            'rebate_limit': 700000,
+            'rebate_max': 25000,
+            'rebate_marginal_relief': True,
+            'surcharge': [(5000000, 0.10), (10000000, 0.15), (20000000, 0.25)],
+            'cess': 0.04
+        }
+    },
+    'FY2025-26': {
+        'old': {
+            'slabs': [(0, 0.00), (250000, 0.05), (500000, 0.20), (1000000, 0.30)],
+            'rebate_limit': 500000,
+            'rebate_max': 12500,
+            'rebate_marginal_relief': False,
+            'surcharge': [(5000000, 0.10), (10000000, 0.15), (20000000, 0.25), (50000000, 0.37)],
+            'cess': 0.04
+        },
+        'new': {
+            'slabs': [(0, 0.00), (400000, 0.05), (800000, 0.10), (1200000, 0.15),
+                      (1600000, 0.20), (2000000, 0.25), (2400000, 0.30)],
+            'rebate_limit': 1200000,
+            'rebate_max': 60000,
+            'rebate_marginal_relief': True,
+            'surcharge': [(5000000, 0.10), (10000000, 0.15), (20000000, 0.25)],
+            'cess': 0.04
+        }
+    }
+}
+
+DEFAULT_FISCAL_YEAR = 'FY2023-24'
+
+def _slab_kernel(slabs):
+    """Precompute lower bounds, rates and cumulative tax at each bound"""
+    lower = np.array([bound for bound, _ in slabs], dtype=float)
+    rates = np.array([rate for _, rate in slabs], dtype=float)
+    base = np.concatenate(([0.0], np.cumsum(np.diff(lower) * rates[:-1])))
+    return lower, rates, base
+
+def _slab_tax(income, kernel):
+    """Evaluate the piecewise-linear slab tax for an array of incomes"""
+    lower, rates, base = kernel
+    idx = np.searchsorted(lower, income, side='right') - 1
+    return base[idx] + (income - lower[idx]) * rates[idx]
+
+def _tax_for_regime(income, table):
+    """Slab tax, 87A rebate, surcharge (with marginal relief) and cess for one table"""
+    kernel = _slab_kernel(table['slabs'])
+    tax = _slab_tax(income, kernel)
+
+    # Section 87A rebate, optionally tapered so tax never exceeds income above the limit
+    limit = table['rebate_limit']
+    rebate = np.where(income <= limit, np.minimum(tax, table['rebate_max']), 0.0)
+    if table['rebate_marginal_relief']:
+        relief = np.maximum(tax - (income - limit), 0.0)
+        rebate = np.where(income > limit, relief, rebate)
+    tax = tax - rebate
+
+    # Surcharge: the increase over a threshold is capped at the income above it
+    surcharge = np.zeros_like(income)
+    prev_rate = 0.0
+    for threshold, rate in table['surcharge']:
+        above = income > threshold
+        tax_at_threshold = _slab_tax(np.float64(threshold), kernel)
+        capped = tax_at_threshold * (1 + prev_rate) + (income - threshold) - tax
+        surcharge = np.where(above, np.minimum(tax * rate, capped), surcharge)
+        prev_rate = rate
+
+    cess = (tax + surcharge) * table['cess']
+    return tax, rebate, surcharge, cess
+
+def calculate_tax_batch(income, regime='old', fiscal_year=None):
+    """Calculate Indian income tax for a scalar or NumPy array of taxable incomes
+
+    ``regime`` may be 'old', 'new' or an array of those strings matching ``income``.
+    """
+    income = np.maximum(np.asarray(income, dtype=float), 0.0)
+    tables = TAX_TABLES[fiscal_year or DEFAULT_FISCAL_YEAR]
+
+    if np.ndim(regime) == 0:
+        tax, rebate, surcharge, cess = _tax_for_regime(income, tables[regime])
+    else:
+        is_old = np.asarray(regime) == 'old'
+        old = _tax_for_regime(income, tables['old'])
+        new = _tax_for_regime(income, tables['new'])
+        tax, rebate, surcharge, cess = (np.where(is_old, o, n) for o, n in zip(old, new))
+
+    total_tax = tax + surcharge + cess
+    income_positive = income > 0
+    safe_income = np.where(income_positive, income, 1.0)
+
+    return {
+        'tax': tax,
+        'rebate': rebate,
+        'surcharge': surcharge,
+        'cess': cess,
+        'total_tax': total_tax,
+        'after_tax_income': income - total_tax,
+        'effective_rate': np.where(income_positive, total_tax / safe_income * 100, 0.0)
+    }
+
+@timed('calc.tax')
+@cached(assumptions=('TAX_TABLES', 'DEFAULT_FISCAL_YEAR'))
+def calculate_tax_india(income, regime='old', fiscal_year=None):
+    """Calculate income tax for India"""
+    result = calculate_tax_batch(income, regime, fiscal_year)
+    return {key: float(value) for key, value in result.items()}
+
+# ===== LOAN EMI CALCULATOR =====
+
+class AmortizationSchedule:
+    """Lazy amortization schedule evaluated from the closed-form balance
+
+    Only the loan terms are stored; any row is computed in O(1) and any page
+    or slice in one vectorized pass, so the full table is never held unless
+    ``columns`` or ``to_dataframe()`` is asked for. Still behaves like the old
+    list of per-month dicts (``len``, indexing, slicing and iteration).
+    """
+
+    COLUMNS = ('Month', 'EMI', 'Principal', 'Interest', 'Remaining')
+
+    def __init__(self, principal, monthly_rate, emi, months):
+        # Callers pass years * 12, a float whenever years is (20.0 and 20 share a cache key)
+        if not float(months).is_integer() or months < 0:
+            raise ValueError('loan term must be a whole, non-negative number of months')
+        self.principal = principal
+        self.monthly_rate = monthly_rate
+        self.emi = emi
+        self.months = int(months)
+
+    def _balance(self, month):
+        """Outstanding balance after ``month`` payments"""
+        month = np.asarray(month, dtype=float)
+        if self.monthly_rate == 0:
+            return self.principal - self.emi * month
+        growth_minus_one = np.expm1(month * np.log1p(self.monthly_rate))
+        return self.principal + growth_minus_one * (self.principal - self.emi / self.monthly_rate)
+
+    def _compute(self, month):
+        """Schedule columns for an array of 1-based month numbers"""
+        interest = self._balance(month - 1) * self.monthly_rate
+        return {
+            'Month': month,
+            'EMI': np.full(month.shape, float(self.emi)),
+            'Principal': self.emi - interest,
+            'Interest': interest,
+            'Remaining': np.maximum(0, self._balance(month))
+        }
+
+    def rows(self, start=0, stop=None):
+        """Columns for the 0-based row range [start, stop)"""
+        stop = self.months if stop is None else min(stop, self.months)
+        return self._compute(np.arange(max(start, 0) + 1, max(stop, start, 0) + 1))
+
+    def page(self, number, size=12):
+        """Columns for 0-based page ``number`` of ``size`` rows"""
+        return self.rows(number * size, (number + 1) * size)
+
+    def page_count(self, size=12):
+        return -(-self.months // size)
+
+    def iter_pages(self, size=120):
+        """Yield the schedule as consecutive column pages"""
+        for number in range(self.page_count(size)):
+            yield self.page(number, size)
+
+    @property
+    def columns(self):
+        """Full schedule as NumPy columns (materializes every row)"""
+        return self.rows()
+
+    def yearly(self):
+        """Year-wise roll-up computed from the balance at each year boundary"""
+        year_end = np.minimum(np.arange(1, -(-self.months // 12) + 1) * 12, self.months)
+        year_start = np.concatenate(([0], year_end[:-1]))
+        opening = np.maximum(0, self._balance(year_start))
+        closing = np.maximum(0, self._balance(year_end))
+        payments = self.emi * (year_end - year_start)
+        principal_paid = opening - closing
+        return {
+            'Year': np.arange(1, year_end.size + 1),
+            'EMI': payments,
+            'Principal': principal_paid,
+            'Interest': payments - principal_paid,
+            'Remaining': closing
+        }
+
+    def to_csv(self, path_or_buf, page_size=1200):
+        """Stream the schedule to CSV one page at a time"""
+        import pandas as pd
+
+        own_file = isinstance(path_or_buf, str)
+        handle = open(path_or_buf, 'w', newline='') if own_file else path_or_buf
+        try:
+            header = True
+            for page in self.iter_pages(page_size):
+                pd.DataFrame(page, columns=list(self.COLUMNS)).to_csv(handle, header=header, index=False)
+                header = False
+        finally:
+            if own_file:
+                handle.close()
+
+    def __len__(self):
+        return self.months
+
+    @staticmethod
+    def _records(columns):
+        return [
+            {name: (int(column[i]) if name == 'Month' else float(column[i]))
+             for name, column in columns.items()}
+            for i in range(len(columns['Month']))
+        ]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self.months)
+            return self._records(self._compute(np.arange(start, stop, step) + 1))
+        if index < 0:
+            index += self.months
+        if not 0 <= index < self.months:
+            raise IndexError('amortization index out of range')
+        return self._records(self.rows(index, index + 1))[0]
+
+    def __iter__(self):
+        for page in self.iter_pages():
+            yield from self._records(page)
+
+    def to_records(self):
+        """Old list-of-dicts shape"""
+        return list(self)
+
+    def to_dataframe(self):
+        """Schedule as a DataFrame built directly from the columns"""
+        import pandas as pd
+
+        return pd.DataFrame(self.columns, columns=list(self.COLUMNS))
+
+def calculate_loan_emi_batch(principal, annual_rate, years):
+    """Calculate EMI and totals for scalars or NumPy arrays of loans (broadcast)
+
+    ``annual_rate`` is a percentage, as in calculate_loan_emi.
+    """
+    principal = np.asarray(principal, dtype=float)
+    monthly_rate = np.asarray(annual_rate, dtype=float) / 12 / 100
+    months = np.asarray(years, dtype=float) * 12
+
+    growth_minus_one = np.expm1(months * np.log1p(monthly_rate))
+    zero_rate = monthly_rate == 0
+    safe_growth = np.where(zero_rate, 1.0, growth_minus_one)
+    emi = np.where(zero_rate, principal / months,
+                   principal * monthly_rate * (growth_minus_one + 1) / safe_growth)
+    total_payment = emi * months
+
+    return {
+        'emi': emi,
+        'total_payment': total_payment,
+        'total_interest': total_payment - principal
+    }
+
+@timed('calc.emi')
+@cached
+def calculate_loan_emi(principal, annual_rate, years):
+    """Calculate loan EMI (``years * 12`` must be a whole number of months)"""
+    result = {key: float(value)
+              for key, value in calculate_loan_emi_batch(principal, annual_rate, years).items()}
+    result['amortization'] = AmortizationSchedule(principal, annual_rate / 12 / 100, result['emi'],
+                                                  years * 12)
+    return result
+
+# ===== MUTUAL FUND CALCULATOR =====
+
+def calculate_mutual_fund_batch(investment, annual_return, years, is_sip=False):
+    """Calculate lump-sum or SIP mutual fund returns for scalars or NumPy arrays (broadcast)"""
+    investment = np.asarray(investment, dtype=float)
+    months = np.asarray(years, dtype=float) * 12
+    monthly_rate = np.asarray(annual_return, dtype=float) / 12
+    is_sip = np.asarray(is_sip, dtype=bool)
+
+    sip = calculate_sip_batch(investment, annual_return, years)
+    total_invested = np.where(is_sip, sip['total_invested'], investment)
+    final_value = np.where(is_sip, sip['final_value'],
+                           investment * np.exp(months * np.log1p(monthly_rate)))
+    gain = final_value - total_invested
+    invested_positive = total_invested > 0
+    safe_invested = np.where(invested_positive, total_invested, 1.0)
+
+    return {
+        'total_invested': total_invested,
+        'final_value': final_value,
+        'gain': gain,
+        'gain_percentage': np.where(invested_positive, gain / safe_invested * 100, 0.0)
+    }
+
+@timed('calc.mutual_funds')
+@cached
+def calculate_mutual_fund_returns(investment, annual_return, years, is_sip=False):
+    """Calculate mutual fund returns"""
+    result = calculate_mutual_fund_batch(investment, annual_return, years, is_sip)
+    return {key: float(value) for key, value in result.items()}
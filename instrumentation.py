@@ -0,0 +1,200 @@
+"""
+Instrumentation for Smart Portfolio Builder
+Lightweight timing spans aggregated into latency histograms
+
+Recording is off unless SPB_PROFILE is set (or enable() is called); while
+off, span() hands out a shared no-op context and timed() functions make one
+flag check before calling straight through.
+"""
+
+import functools
+import json
+import math
+import os
+import threading
+import time
+from contextlib import nullcontext
+
+# ===== HISTOGRAM =====
+
+class Histogram:
+    """Log-bucketed latency histogram in constant memory
+
+    Bucket i holds durations in (gamma ** (i - 1), gamma ** i], so every
+    quantile is reported within ``relative_accuracy`` of the true value.
+    """
+
+    def __init__(self, relative_accuracy=0.02):
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        index = math.ceil(math.log(max(seconds, 1e-9)) / self._log_gamma)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q):
+        if not self.count:
+            return 0.0
+        rank = q * self.count  # nearest rank: the p99 of a handful of samples is their max
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return min(2 * self.gamma ** index / (self.gamma + 1), self.max)
+        return self.max
+
+# ===== RECORDER =====
+
+class Recorder:
+    """Thread-safe span histograms keyed by span name"""
+
+    def __init__(self, relative_accuracy=0.02):
+        self.relative_accuracy = relative_accuracy
+        self._histograms = {}
+        self._errors = {}
+        self._lock = threading.Lock()
+        self.since = time.time()
+
+    def record(self, name, seconds):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram(self.relative_accuracy)
+            histogram.record(seconds)
+
+    def error(self, name):
+        """Count a span that ended in an exception (its duration is not recorded)"""
+        with self._lock:
+            self._errors[name] = self._errors.get(name, 0) + 1
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._errors.clear()
+            self.since = time.time()
+
+    def snapshot(self):
+        """Per-span count, errors and latency summary in milliseconds, by name"""
+        with self._lock:
+            names = sorted(set(self._histograms) | set(self._errors))
+            summary = {}
+            for name in names:
+                histogram = self._histograms.get(name) or Histogram(self.relative_accuracy)
+                summary[name] = {
+                    'count': histogram.count,
+                    'errors': self._errors.get(name, 0),
+                    'total_ms': histogram.total * 1000,
+                    'mean_ms': histogram.total / histogram.count * 1000 if histogram.count else 0.0,
+                    'p50_ms': histogram.quantile(0.50) * 1000,
+                    'p95_ms': histogram.quantile(0.95) * 1000,
+                    'p99_ms': histogram.quantile(0.99) * 1000,
+                    'max_ms': histogram.max * 1000
+                }
+            return summary
+
+RECORDER = Recorder()
+
+# ===== SPANS =====
+
+_enabled = os.environ.get('SPB_PROFILE', '') not in ('', '0')
+_local = threading.local()
+_NULL_SPAN = nullcontext()
+
+def enabled():
+    return _enabled
+
+def enable(on=True):
+    """Turn span recording on or off for the whole process"""
+    global _enabled
+    _enabled = bool(on)
+
+class _Span:
+    __slots__ = ('name', 'start', 'depth')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.depth = getattr(_local, 'depth', 0)
+        _local.depth = self.depth + 1
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        _local.depth = self.depth
+        if exc_type is not None:
+            RECORDER.error(self.name)
+            return False
+        RECORDER.record(self.name, elapsed)
+        trace = getattr(_local, 'trace', None)
+        if trace is not None:
+            trace.append((self.start, self.depth, self.name, elapsed))
+        return False
+
+def span(name):
+    """Context manager timing its block as span ``name`` (a shared no-op while disabled)
+
+    Blocks that raise count as errors for the span rather than as a duration.
+    """
+    return _Span(name) if _enabled else _NULL_SPAN
+
+def timed(name=None):
+    """Decorator timing every call as span ``name`` (default: the function's name)"""
+    def decorate(func):
+        label = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with _Span(label):
+                return func(*args, **kwargs)
+
+        return wrapper
+    return decorate
+
+# ===== TRACES =====
+
+def begin_trace():
+    """Start collecting this thread's spans, e.g. for one Streamlit rerun"""
+    if _enabled:
+        _local.trace = []
+        _local.trace_start = time.perf_counter()
+
+def end_trace(name='rerun'):
+    """Stop collecting; record the traced interval as span ``name``
+
+    Returns the spans completed meanwhile in start order as
+    (offset_ms, depth, span, duration_ms) rows, or None when not tracing.
+    """
+    trace = getattr(_local, 'trace', None)
+    if trace is None:
+        return None
+    _local.trace = None
+    start = _local.trace_start
+    RECORDER.record(name, time.perf_counter() - start)
+    return [((began - start) * 1000, depth, span_name, elapsed * 1000)
+            for began, depth, span_name, elapsed in sorted(trace)]
+
+# ===== EXPORT =====
+
+def dump():
+    """Machine-readable snapshot of every span"""
+    return {
+        'enabled': _enabled,
+        'since': RECORDER.since,
+        'generated': time.time(),
+        'relative_accuracy': RECORDER.relative_accuracy,
+        'spans': RECORDER.snapshot()
+    }
+
+def dump_json(**json_options):
+    return json.dumps(dump(), **json_options)
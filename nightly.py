@@ -0,0 +1,433 @@
+"""
+Nightly recompute for Smart Portfolio Builder
+Shards the client book across worker processes, checkpointing each finished shard
+
+Usage: python nightly.py clients.csv runs/2024-06-30 [--output results.csv] [--workers N]
+                         [--previous runs/2024-06-29]
+
+Every shard is written to ``<run dir>/shards/`` and recorded in
+``<run dir>/manifest.json`` as soon as it completes. Re-running the same
+command after a crash skips the recorded shards and computes the rest.
+Workers read their own slice of the book (a byte range of the CSV or a set
+of Parquet row groups), so reading, computing and writing all scale with
+the number of processes. CSV sharding splits on newlines: quoted fields
+must not contain line breaks.
+
+With ``--previous`` only dirty work is redone: a client's results for a
+calculator are copied from the previous run when its key is found there,
+its inputs hash the same and the calculator's version (code, assumption
+tables such as RETURNS_DATA or TAX_TABLES, and options) is unchanged.
+Each shard reads only the previous shards whose key range overlaps its own,
+so books kept in key order reuse results at the cost of one shard each.
+"""
+
+import argparse
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+
+from batch import (CALCULATORS, TAX_TABLES, ChunkWriter, available_calculators, calculator_version,
+                   check_columns, column_dtypes, compute_chunk, input_columns, input_fingerprints,
+                   is_parquet, read_columns)
+
+DEFAULT_SHARD_SIZE = 250_000
+MANIFEST = 'manifest.json'
+SCAN_BLOCK = 16 * 1024 * 1024
+FINGERPRINT_PREFIX = '_fingerprint_'
+
+# ===== SHARD PLANNING =====
+
+def _csv_shards(path, shard_size):
+    """Byte ranges holding ``shard_size`` data rows each, after the header line"""
+    starts = []
+    with open(path, 'rb') as handle:
+        handle.readline()
+        offset = handle.tell()
+        starts.append(offset)
+        rows = 0
+        while True:
+            block = handle.read(SCAN_BLOCK)
+            if not block:
+                break
+            newlines = np.flatnonzero(np.frombuffer(block, dtype=np.uint8) == ord('\n'))
+            row_numbers = rows + 1 + np.arange(newlines.size)
+            starts.extend((offset + newlines[row_numbers % shard_size == 0] + 1).tolist())
+            rows += newlines.size
+            offset += len(block)
+    size = os.path.getsize(path)
+    bounds = [start for start in starts if start < size] + [size]
+    return [{'start': start, 'stop': stop} for start, stop in zip(bounds, bounds[1:])]
+
+def _parquet_shards(path, shard_size):
+    """Runs of whole row groups holding about ``shard_size`` rows each"""
+    import pyarrow.parquet as pq
+
+    metadata = pq.ParquetFile(path).metadata
+    shards, groups, rows = [], [], 0
+    for index in range(metadata.num_row_groups):
+        groups.append(index)
+        rows += metadata.row_group(index).num_rows
+        if rows >= shard_size:
+            shards.append({'row_groups': groups})
+            groups, rows = [], 0
+    if groups:
+        shards.append({'row_groups': groups})
+    return shards
+
+def plan_shards(path, shard_size=DEFAULT_SHARD_SIZE):
+    """Split a client book into independently readable shards"""
+    return _parquet_shards(path, shard_size) if is_parquet(path) else _csv_shards(path, shard_size)
+
+def read_shard(path, shard, columns, dtypes=None):
+    """DataFrame of one shard's rows; ``dtypes`` applies to CSV as in batch.read_chunks"""
+    if is_parquet(path):
+        import pyarrow.parquet as pq
+        return pq.ParquetFile(path).read_row_groups(shard['row_groups'], columns=columns).to_pandas()
+    import pandas as pd
+    with open(path, 'rb') as handle:
+        header = handle.readline()
+        handle.seek(shard['start'])
+        body = handle.read(shard['stop'] - shard['start'])
+    return pd.read_csv(io.BytesIO(header + body), usecols=columns, dtype=dtypes)
+
+# ===== INCREMENTAL REUSE =====
+
+def _key_range(values):
+    """[min, max] of a key column for the manifest, or None when not JSON-comparable"""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    if not isinstance(values, pa.Array):
+        values = pa.array(values, from_pandas=True)
+    bounds = pc.min_max(values)
+    low, high = bounds['min'].as_py(), bounds['max'].as_py()
+    if not all(isinstance(bound, (int, float, str)) and not isinstance(bound, bool)
+               for bound in (low, high)):
+        return None
+    return [low, high]
+
+def _shard_key_range(values):
+    """_key_range of the keys in a shard, by value when every key is a number read as text"""
+    import pandas as pd
+
+    keys = pd.Series(values)
+    numbers = pd.to_numeric(keys, errors='coerce')
+    return _key_range(numbers.to_numpy() if numbers.count() == keys.count() else values)
+
+def _overlaps(key_range, low, high):
+    if key_range is None:
+        return True
+    try:
+        return not (key_range[1] < low or high < key_range[0])
+    except TypeError:
+        return True
+
+def _previous_rows(run_dir, key, ids, key_ranges=None):
+    """Stored columns of a previous run for the clients in ``ids``
+
+    Only the previous shards whose key range (``key_ranges``, by shard
+    index) overlaps that of ``ids`` are read, and within them only the row
+    groups whose statistics do, so a book kept in key order reads about one
+    shard's worth of results per shard.
+
+    Returns the columns and, per entry of ``ids``, the matching stored row
+    (-1 for clients the previous run did not have), or ``(None, None)``
+    when the stored keys cannot be compared with ``ids``.
+    """
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    key_ranges = key_ranges or {}
+    current = _shard_key_range(ids)
+    files = sorted((Path(run_dir) / 'shards').glob('shard-*.parquet'))
+    if current is not None:
+        files = [path for path in files
+                 if _overlaps(key_ranges.get(str(int(path.stem.split('-')[1]))), *current)]
+    if not files:
+        return None, None
+    dataset = ds.dataset([str(path) for path in files], format='parquet')
+    try:
+        wanted = pa.array(ids, from_pandas=True).cast(dataset.schema.field(key).type)
+    except (KeyError, pa.ArrowInvalid, pa.ArrowNotImplementedError):
+        return None, None
+    condition = ds.field(key).isin(wanted)
+    bounds = _key_range(wanted)
+    if bounds is not None:
+        # a range predicate lets Arrow skip row groups by their min/max statistics
+        condition &= (ds.field(key) >= bounds[0]) & (ds.field(key) <= bounds[1])
+    table = dataset.to_table(filter=condition)
+    stored = {name: table[name].to_numpy(zero_copy_only=False) for name in table.column_names}
+    # a client listed twice keeps its last stored row
+    latest = ~pd.Index(stored[key]).duplicated(keep='last')
+    positions = pd.Index(stored[key][latest]).get_indexer(ids)
+    found = positions >= 0
+    positions[found] = np.flatnonzero(latest)[positions[found]]
+    return stored, positions
+
+def compute_incremental(frame, calculators, options, keep, versions, key=None, previous=None):
+    """compute_chunk that reuses a previous run's results for unchanged clients
+
+    ``previous`` is ``(run dir, calculator versions, calculator output
+    columns, shard key ranges)`` of that run; only the recorded output
+    columns of a calculator are ever copied, never ``keep`` columns. Outputs
+    gain a fingerprint column per calculator for the next run to compare
+    against. Returns the outputs, seconds per calculator, the number of
+    reused rows per calculator and each calculator's output columns.
+    """
+    output = {column: frame[column].to_numpy() for column in keep}
+    stored = positions = None
+    if previous is not None:
+        stored, positions = _previous_rows(previous[0], key, frame[key].to_numpy(), previous[3])
+    timings, reused, outputs = {}, {}, {}
+    for name in calculators:
+        fingerprints = input_fingerprints(frame, name)
+        fingerprint_column = FINGERPRINT_PREFIX + name
+        previous_outputs = [column for column in (previous[2].get(name) or ()) if column not in keep
+                            ] if previous is not None else []
+        clean = np.zeros(len(frame), dtype=bool)
+        if (stored is not None and previous[1].get(name) == versions[name]
+                and previous_outputs and fingerprint_column in stored
+                and all(column in stored for column in previous_outputs)):
+            matched = positions >= 0
+            clean[matched] = stored[fingerprint_column][positions[matched]] == fingerprints[matched]
+        dirty = ~clean
+
+        results, seconds = {}, {name: 0.0}
+        if dirty.any():
+            results, seconds = compute_chunk(frame if dirty.all() else frame[dirty], [name], options)
+        if clean.any():
+            rows = positions.clip(0)
+            for column in previous_outputs:
+                values = stored[column][rows]
+                if column in results:
+                    values[dirty] = results[column]
+                results[column] = values
+        output.update(results)
+        output[fingerprint_column] = fingerprints
+        timings[name] = seconds[name]
+        reused[name] = int(clean.sum())
+        outputs[name] = list(results)
+    return output, timings, reused, outputs
+
+# ===== WORKER =====
+
+def _shard_path(run_dir, index):
+    return Path(run_dir) / 'shards' / f'shard-{index:05d}.parquet'
+
+def run_shard(source, shard, index, run_dir, columns, calculators, options, keep, versions,
+              key=None, previous=None):
+    """Compute one shard into its checkpoint file; returns its timings"""
+    start = time.perf_counter()
+    frame = read_shard(source, shard, columns, column_dtypes(calculators, columns))
+    read_seconds = time.perf_counter() - start
+    output, calculator_seconds, reused, outputs = compute_incremental(frame, calculators, options,
+                                                                      keep, versions, key, previous)
+
+    with ChunkWriter(str(_shard_path(run_dir, index))) as writer:
+        writer.write(output)
+    return {
+        'index': index,
+        'rows': len(frame),
+        'seconds': time.perf_counter() - start,
+        'read_seconds': read_seconds,
+        'calculator_seconds': calculator_seconds,
+        'reused': reused,
+        'key_range': _shard_key_range(output[key]) if key in output else None,
+        'outputs': outputs,
+        'pid': os.getpid()
+    }
+
+# ===== MANIFEST =====
+
+def _source_fingerprint(path):
+    stat = os.stat(path)
+    return {'path': os.path.abspath(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+def load_manifest(run_dir):
+    path = Path(run_dir) / MANIFEST
+    if not path.exists():
+        return None
+    with open(path) as handle:
+        return json.load(handle)
+
+def save_manifest(run_dir, manifest):
+    """Write the manifest atomically so a crash never leaves it half written"""
+    path = Path(run_dir) / MANIFEST
+    staging = path.with_name(f'.{MANIFEST}.{os.getpid()}')
+    with open(staging, 'w') as handle:
+        json.dump(manifest, handle, indent=1)
+    os.replace(staging, path)
+
+def completed_shards(run_dir, manifest):
+    """Indices of shards recorded as done whose checkpoint file still exists"""
+    return {int(index) for index in manifest['completed']
+            if _shard_path(run_dir, int(index)).exists()}
+
+# ===== RUNNER =====
+
+def recompute(source, run_dir, calculators=None, workers=None, shard_size=DEFAULT_SHARD_SIZE,
+              options=None, keep=None, restart=False, progress=None, previous=None, key='client_id'):
+    """Recompute the client book shard by shard, resuming an interrupted run
+
+    With ``previous`` (the run directory of an earlier, complete run) the
+    results of clients whose ``key`` is found there with unchanged inputs and
+    calculator versions are reused rather than recomputed.
+
+    Returns the manifest: the shard plan, the timings of every completed
+    shard and a summary of this invocation. Raises ValueError when
+    ``run_dir`` holds a run for a different book or configuration (pass
+    ``restart=True`` to discard it).
+    """
+    run_dir = Path(run_dir)
+    (run_dir / 'shards').mkdir(parents=True, exist_ok=True)
+    columns = read_columns(source)
+    calculators = list(calculators or available_calculators(columns))
+    check_columns(calculators, columns)
+    keep = [c for c in (keep if keep is not None else ['client_id']) if c in columns]
+    versions = {name: calculator_version(name, options) for name in calculators}
+    reuse = None
+    if previous is not None:
+        earlier = load_manifest(previous)
+        if earlier is None or len(completed_shards(previous, earlier)) != len(earlier['shards']):
+            raise ValueError(f'{previous} is not a complete run')
+        if key not in columns:
+            raise ValueError(f'reusing {previous} needs a {key} column to match clients')
+        keep = list(dict.fromkeys([key] + keep))
+        reuse = (os.path.abspath(previous), earlier.get('versions', {}), earlier.get('outputs', {}),
+                 {index: timing.get('key_range') for index, timing in earlier['completed'].items()})
+    config = {
+        'source': _source_fingerprint(source),
+        'calculators': calculators,
+        'options': options or {},
+        'keep': keep,
+        'shard_size': shard_size,
+        'previous': reuse and reuse[0]
+    }
+
+    manifest = None if restart else load_manifest(run_dir)
+    if manifest is not None and (manifest['config'] != config
+                                 or manifest.get('versions') != versions):
+        raise ValueError(f'{run_dir} holds a run for a different book or configuration; '
+                         'use a new run directory or restart')
+    if manifest is None:
+        for stale in (run_dir / 'shards').glob('*.parquet'):
+            stale.unlink()
+        manifest = {'config': config, 'versions': versions, 'shards': plan_shards(source, shard_size),
+                    'completed': {}}
+        save_manifest(run_dir, manifest)
+
+    done = completed_shards(run_dir, manifest)
+    pending = [index for index in range(len(manifest['shards'])) if index not in done]
+    read = list(dict.fromkeys(keep + input_columns(calculators, columns)))
+    failures = {}
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(run_shard, source, manifest['shards'][index], index, str(run_dir),
+                               read, calculators, config['options'], keep, versions, key, reuse): index
+                   for index in pending}
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                timing = future.result()
+            except Exception as exc:  # keep going; the shard is retried on the next run
+                failures[index] = repr(exc)
+                continue
+            # every shard of a run has the same output columns
+            manifest.setdefault('outputs', timing.pop('outputs'))
+            manifest['completed'][str(index)] = timing
+            save_manifest(run_dir, manifest)
+            if progress is not None:
+                progress(timing, len(manifest['completed']), len(manifest['shards']))
+
+    elapsed = time.perf_counter() - start
+    finished = [manifest['completed'][str(index)] for index in pending
+                if str(index) in manifest['completed']]
+    rows = sum(timing['rows'] for timing in finished)
+    manifest['last_run'] = {
+        'resumed_shards': len(done),
+        'computed_shards': len(pending) - len(failures),
+        'failed_shards': failures,
+        'rows': rows,
+        'seconds': elapsed,
+        'rows_per_second': rows / elapsed if elapsed else 0.0,
+        'reused': {name: sum(timing['reused'][name] for timing in finished) for name in calculators},
+        'workers': workers or os.cpu_count()
+    }
+    save_manifest(run_dir, manifest)
+    return manifest
+
+def merge_shards(run_dir, destination):
+    """Concatenate the checkpointed shards, in book order, into one results file"""
+    import pyarrow.parquet as pq
+
+    manifest = load_manifest(run_dir)
+    if len(completed_shards(run_dir, manifest)) != len(manifest['shards']):
+        raise ValueError(f'{run_dir} is incomplete; finish the run before merging')
+    with ChunkWriter(destination) as writer:
+        for index in range(len(manifest['shards'])):
+            table = pq.read_table(_shard_path(run_dir, index))
+            writer.write({name: table[name].to_numpy() for name in table.column_names
+                          if not name.startswith(FINGERPRINT_PREFIX)})
+    return writer.rows
+
+def _report_shard(timing, completed, total, stream=sys.stderr):
+    print(f"shard {timing['index']:>5}  {timing['rows']:>9,} rows  {timing['seconds']:7.2f}s  "
+          f"(read {timing['read_seconds']:.2f}s, calc {sum(timing['calculator_seconds'].values()):.2f}s, "
+          f"{sum(timing['reused'].values()):,} results reused)  "
+          f"pid {timing['pid']}  [{completed}/{total}]", file=stream)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Recompute the client book across worker processes')
+    parser.add_argument('source', help='client inputs (.csv, .parquet)')
+    parser.add_argument('run_dir', help='checkpoint directory; reuse it to resume')
+    parser.add_argument('--output', help='merge the shards into this file when every shard is done')
+    parser.add_argument('--workers', type=int, help='worker processes (default: CPU count)')
+    parser.add_argument('--shard-size', type=int, default=DEFAULT_SHARD_SIZE, help='rows per shard')
+    parser.add_argument('--calculators', help=f"comma-separated subset of {', '.join(CALCULATORS)}")
+    parser.add_argument('--fiscal-year', choices=sorted(TAX_TABLES), help='tax tables to use')
+    parser.add_argument('--regime', choices=('old', 'new'), default='new',
+                        help='tax regime for books without a tax_regime column')
+    parser.add_argument('--keep', default='client_id',
+                        help='comma-separated input columns copied to the results')
+    parser.add_argument('--restart', action='store_true', help='discard checkpoints in run_dir')
+    parser.add_argument('--previous', help='run directory of an earlier run whose unchanged results are reused')
+    parser.add_argument('--key', default='client_id', help='column identifying a client across runs')
+    parser.add_argument('--quiet', action='store_true', help='no per-shard timings')
+    args = parser.parse_args(argv)
+
+    try:
+        manifest = recompute(args.source, args.run_dir,
+                             args.calculators.split(',') if args.calculators else None,
+                             args.workers, args.shard_size,
+                             {'fiscal_year': args.fiscal_year, 'regime': args.regime},
+                             [c for c in args.keep.split(',') if c], args.restart,
+                             progress=None if args.quiet else _report_shard,
+                             previous=args.previous, key=args.key)
+    except ValueError as exc:
+        parser.error(str(exc))
+
+    summary = manifest['last_run']
+    print(f"{summary['computed_shards']} shards computed, {summary['resumed_shards']} resumed, "
+          f"{len(summary['failed_shards'])} failed: {summary['rows']:,} rows in {summary['seconds']:.2f}s "
+          f"({summary['rows_per_second']:,.0f} rows/s on {summary['workers']} workers)", file=sys.stderr)
+    if args.previous:
+        print('  reused: ' + ', '.join(f'{name} {count:,}' for name, count in summary['reused'].items()),
+              file=sys.stderr)
+    for index, error in summary['failed_shards'].items():
+        print(f"  shard {index} failed: {error}", file=sys.stderr)
+    if summary['failed_shards']:
+        return 1
+    if args.output:
+        rows = merge_shards(args.run_dir, args.output)
+        print(f"merged {rows:,} rows into {args.output}", file=sys.stderr)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
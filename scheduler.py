@@ -0,0 +1,289 @@
+"""
+Job scheduling for Smart Portfolio Builder
+Bounded, prioritized worker pool for heavy computations with per-session quotas
+"""
+
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import CancelledError, Future
+
+from instrumentation import span
+
+# ===== PRIORITIES =====
+
+INTERACTIVE = 0  # a user is waiting on the page
+BATCH = 1        # API batches and other bulk work
+PRIORITY_NAMES = {INTERACTIVE: 'interactive', BATCH: 'batch'}
+
+class SchedulerBusy(RuntimeError):
+    """The queue is full"""
+
+class QuotaExceeded(SchedulerBusy):
+    """The session already has its quota of jobs queued or running"""
+
+# ===== JOBS =====
+
+class Job:
+    """Handle on a scheduled computation, backed by a concurrent.futures.Future
+
+    A streaming job's function is a generator: each value it yields becomes
+    ``partial`` as soon as it is produced, and the last one is the result.
+    """
+
+    def __init__(self, func, args, kwargs, session, priority, degraded=False, stream=False):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.session = session
+        self.priority = priority
+        self.degraded = degraded
+        self.stream = stream
+        self.future = Future()
+        self.submitted = time.monotonic()
+        self.started = None
+        self.finished = None
+        self.partial = None
+        self.updates = 0
+        self._stop = threading.Event()
+
+    def result(self, timeout=None):
+        return self.future.result(timeout)
+
+    def done(self):
+        return self.future.done()
+
+    def cancel(self):
+        """Drop the job if it has not started, or stop a streaming job at its next update
+
+        True when the job will not run at all.
+        """
+        self._stop.set()
+        return self.future.cancel()
+
+    @property
+    def cancelled(self):
+        return self._stop.is_set()
+
+    @property
+    def wait_time(self):
+        """Seconds spent queued (so far, while still waiting)"""
+        return (self.started or time.monotonic()) - self.submitted
+
+    def _execute(self):
+        if not self.stream:
+            return self.func(*self.args, **self.kwargs)
+        updates = self.func(*self.args, **self.kwargs)
+        try:
+            for value in updates:
+                self.partial = value
+                self.updates += 1
+                if self._stop.is_set():
+                    raise CancelledError()
+        finally:
+            updates.close()
+        return self.partial
+
+class SharedJob:
+    """One caller's handle on a job shared with identical requests (see Scheduler.submit_shared)
+
+    Reads go to the shared job; cancel() only detaches this handle, and the
+    job itself is cancelled once every handle has been.
+    """
+
+    def __init__(self, entry, lock):
+        self._entry = entry
+        self._lock = lock
+        self._detached = False
+
+    def __getattr__(self, name):
+        return getattr(self._entry['job'], name)
+
+    def cancel(self):
+        with self._lock:
+            if self._detached:
+                return False
+            self._detached = True
+            self._entry['handles'] -= 1
+            if self._entry['handles']:
+                return False
+        return self._entry['job'].cancel()
+
+    @property
+    def cancelled(self):
+        return self._detached or self._entry['job'].cancelled
+
+# ===== SCHEDULER =====
+
+def _quantile(ordered, q):
+    return ordered[int(q * (len(ordered) - 1))] if ordered else 0.0
+
+class Scheduler:
+    """Fixed pool of worker threads draining a priority queue
+
+    Jobs run in priority order (INTERACTIVE before BATCH), first come first
+    served within a priority. Admission is bounded twice: at most
+    ``max_queue`` jobs wait in total, and each session may have at most
+    ``session_quota`` jobs queued or running (a job may carry its own
+    ``quota``, e.g. for a known API client). Admission never blocks, so it
+    is safe to submit from an event loop and await ``job.future``.
+
+    Under load, work degrades instead of piling up. Once the queue is
+    ``degrade_at`` full, a job's ``degrade`` keyword overrides are applied
+    (e.g. ``{'n_paths': 2000}``). A job that cannot be admitted raises
+    SchedulerBusy or QuotaExceeded at once.
+    """
+
+    def __init__(self, workers=None, max_queue=64, session_quota=4, degrade_at=0.5):
+        self.workers = workers or os.cpu_count() or 2
+        self.max_queue = max_queue
+        self.session_quota = session_quota
+        self.degrade_at = degrade_at
+        self._heap = []
+        self._order = itertools.count()
+        self._cond = threading.Condition()
+        self._running = set()
+        self._threads = []
+        self._waits = deque(maxlen=1024)
+        self._shared = {}
+        self.counters = dict.fromkeys(
+            ('submitted', 'completed', 'failed', 'cancelled', 'degraded', 'rejected', 'attached'), 0)
+
+    def _purge(self):
+        """Forget queued jobs cancelled by their owners (lock held)"""
+        live = [entry for entry in self._heap if not entry[2].future.cancelled()]
+        if len(live) != len(self._heap):
+            self.counters['cancelled'] += len(self._heap) - len(live)
+            heapq.heapify(live)
+            self._heap = live
+
+    def _active(self, session):
+        """Jobs queued or running for ``session`` (lock held)"""
+        return (sum(job.session == session for _, _, job in self._heap) +
+                sum(job.session == session for job in self._running))
+
+    def _start_workers(self):
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._work, name=f'scheduler-{len(self._threads)}',
+                                      daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    def submit(self, func, *args, session=None, priority=INTERACTIVE, degrade=None, stream=False,
+               quota=None, **kwargs):
+        """Queue ``func(*args, **kwargs)`` and return its Job
+
+        ``session`` identifies the caller for quotas (None is unmetered) and
+        ``quota`` overrides ``session_quota`` for it. ``degrade`` holds
+        keyword overrides for a cheaper run under load. With ``stream=True``
+        ``func`` is a generator function (see Job).
+        """
+        quota = self.session_quota if quota is None else quota
+        with self._cond:
+            self._purge()
+            depth = len(self._heap)
+            if depth >= self.max_queue:
+                self.counters['rejected'] += 1
+                raise SchedulerBusy(f'{depth} jobs already queued')
+            if session is not None and self._active(session) >= quota:
+                self.counters['rejected'] += 1
+                raise QuotaExceeded(f'session already has {quota} jobs in progress')
+            degraded = bool(degrade) and depth >= self.degrade_at * self.max_queue
+            job = Job(func, args, {**kwargs, **degrade} if degraded else kwargs,
+                      session, priority, degraded, stream)
+            heapq.heappush(self._heap, (priority, next(self._order), job))
+            self.counters['submitted'] += 1
+            self.counters['degraded'] += degraded
+            self._start_workers()
+            self._cond.notify()
+            return job
+
+    def submit_shared(self, key, func, *args, **kwargs):
+        """submit(), attaching to the job already queued or running for ``key`` if any
+
+        For streaming work many sessions request alike (the same default
+        simulation): they read one job's ``partial`` instead of each running
+        their own. ``key`` identifies the request, e.g. cache.canonical_key.
+        Returns a SharedJob; only the first caller's session is metered.
+        """
+        with self._cond:
+            entry = self._shared.get(key)
+            if entry is not None and not entry['job'].done() and not entry['job'].cancelled:
+                entry['handles'] += 1
+                self.counters['attached'] += 1
+                return SharedJob(entry, self._cond)
+            job = self.submit(func, *args, **kwargs)
+            entry = self._shared[key] = {'job': job, 'handles': 1}
+        job.future.add_done_callback(lambda _: self._forget(key, entry))
+        return SharedJob(entry, self._cond)
+
+    def _forget(self, key, entry):
+        with self._cond:
+            if self._shared.get(key) is entry:
+                del self._shared[key]
+
+    def run(self, func, *args, timeout=None, **kwargs):
+        """submit() and wait for the result"""
+        return self.submit(func, *args, **kwargs).result(timeout)
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._heap:
+                    self._cond.wait()
+                _, _, job = heapq.heappop(self._heap)
+                if not job.future.set_running_or_notify_cancel():
+                    self.counters['cancelled'] += 1
+                    continue
+                job.started = time.monotonic()
+                self._waits.append(job.started - job.submitted)
+                self._running.add(job)
+            try:
+                with span(f"job.{getattr(job.func, '__name__', 'job')}"):
+                    value, error = job._execute(), None
+            except BaseException as exc:  # even SystemExit must not kill the worker or strand the caller
+                value, error = None, exc
+            # Release the session's slot before waking the caller, so it can resubmit at once
+            with self._cond:
+                job.finished = time.monotonic()
+                self._running.discard(job)
+                outcome = ('completed' if error is None else
+                           'cancelled' if isinstance(error, CancelledError) else 'failed')
+                self.counters[outcome] += 1
+            if error is None:
+                job.future.set_result(value)
+            else:
+                job.future.set_exception(error)
+
+    def stats(self):
+        with self._cond:
+            self._purge()
+            queued = dict.fromkeys(PRIORITY_NAMES.values(), 0)
+            for priority, _, job in self._heap:
+                queued[PRIORITY_NAMES.get(priority, str(priority))] += 1
+            sessions = Counter(job.session for _, _, job in self._heap)
+            sessions.update(job.session for job in self._running)
+            sessions.pop(None, None)
+            waits = sorted(self._waits)
+            return {
+                'workers': self.workers,
+                'running': len(self._running),
+                'queue_depth': len(self._heap),
+                'queued': queued,
+                'max_queue': self.max_queue,
+                'saturation': len(self._heap) / self.max_queue,
+                'sessions': len(sessions),
+                'busiest_session': max(sessions.values(), default=0),
+                'session_quota': self.session_quota,
+                'shared_jobs': len(self._shared),
+                'wait_p50': _quantile(waits, 0.50),
+                'wait_p95': _quantile(waits, 0.95),
+                **self.counters
+            }
+
+SCHEDULER = Scheduler(workers=int(os.environ.get('SPB_SCHEDULER_WORKERS', 0)) or None,
+                      max_queue=int(os.environ.get('SPB_SCHEDULER_QUEUE', 64)),
+                      session_quota=int(os.environ.get('SPB_SESSION_QUOTA', 4)))
@@ -0,0 +1,627 @@
+"""
+Monte Carlo simulation for Smart Portfolio Builder
+Simulates correlated monthly asset returns for the risk-profile allocations
+"""
+
+import atexit
+import math
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from cache import coalesced
+from core import (ASSET_CLASSES, RETURNS_DATA, allocation_weights, calculate_retirement,
+                  calculate_wealth_projection, get_risk_profile)
+from instrumentation import timed
+
+# ===== MARKET ASSUMPTIONS =====
+
+# Annualized volatility per asset class (expected returns come from RETURNS_DATA)
+VOLATILITY = {'Equity': 0.18, 'Debt': 0.05, 'Gold': 0.15, 'Cash': 0.01}
+
+# Correlation of monthly log returns, ordered like ASSET_CLASSES
+CORRELATION = np.array([
+    [1.00, 0.10, -0.05, 0.00],
+    [0.10, 1.00, 0.10, 0.20],
+    [-0.05, 0.10, 1.00, 0.00],
+    [0.00, 0.20, 0.00, 1.00]
+])
+
+DEFAULT_PERCENTILES = (5, 25, 50, 75, 95)
+
+# Paths per batch. Fixed so the seed -> batch mapping, and therefore the
+# result, does not depend on how the batches are scheduled.
+BATCH_SIZE = 4096
+
+# Independent scramblings the Halton sampler splits a run into (more when a
+# replicate would exceed BATCH_SIZE); its standard errors come from their spread
+HALTON_REPLICATES = 32
+
+# Progressive runs summarize again once their paths have grown this many times,
+# so percentile work stays within a small multiple of one final summary
+SUMMARY_GROWTH = 2
+
+SAMPLERS = ('pseudo', 'halton')
+
+# ===== MODEL =====
+
+def _market_model():
+    """Monthly log-return means and scaled Cholesky factor for ASSET_CLASSES
+
+    Means are set so each asset's expected monthly gross return is exactly
+    1 + expected / 12, matching the deterministic 'expected' scenario.
+    """
+    expected = np.array([RETURNS_DATA[asset]['expected'] for asset in ASSET_CLASSES])
+    monthly_vol = np.array([VOLATILITY[asset] for asset in ASSET_CLASSES]) / np.sqrt(12)
+    log_mean = np.log1p(expected / 12) - monthly_vol ** 2 / 2
+    chol = np.linalg.cholesky(CORRELATION) * monthly_vol[:, None]
+    return log_mean, chol
+
+def blended_volatility(allocation):
+    """Annualized volatility of an allocation under VOLATILITY and CORRELATION"""
+    weights = allocation_weights(allocation)
+    vol = np.array([VOLATILITY[asset] for asset in ASSET_CLASSES])
+    return float(np.sqrt(weights @ (CORRELATION * np.outer(vol, vol)) @ weights))
+
+def expected_final_value(allocation, initial, monthly, years):
+    """Closed-form E[final wealth] under the simulation model
+
+    Monthly gross returns are independent with mean 1 + blended expected / 12,
+    so this equals the 'expected' scenario of calculate_scenarios.
+    """
+    blended = allocation_weights(allocation) @ np.array(
+        [RETURNS_DATA[asset]['expected'] for asset in ASSET_CLASSES])
+    return calculate_wealth_projection(initial, monthly, float(blended), years).final_value
+
+def _batch_bounds(n_paths, batch_size=BATCH_SIZE):
+    """(start, stop) path ranges covering n_paths"""
+    return [(start, min(start + batch_size, n_paths)) for start in range(0, n_paths, batch_size)]
+
+def _batch_seeds(seed, n_batches):
+    """One independent child seed sequence per batch, spawned from ``seed``"""
+    return np.random.SeedSequence(seed).spawn(n_batches)
+
+def _replicate_bounds(n_paths, replicates=HALTON_REPLICATES, step=1):
+    """Near-equal (start, stop) ranges, one per randomized-QMC replicate
+
+    At least ``replicates`` ranges (given enough paths), more when one would
+    exceed BATCH_SIZE; sizes are multiples of ``step`` (2 keeps antithetic
+    pairs in one replicate).
+    """
+    units = n_paths // step
+    count = max(1, min(max(replicates, -(-n_paths // BATCH_SIZE)), units))
+    edges = [i * units // count * step for i in range(count + 1)]
+    return list(zip(edges[:-1], edges[1:]))
+
+def _batch_specs(n_paths, seed, bounds=None):
+    """(index, (start, stop), seed sequence) for every batch of a run"""
+    bounds = bounds or _batch_bounds(n_paths)
+    return [(index, bound, seed_seq)
+            for index, (bound, seed_seq) in enumerate(zip(bounds, _batch_seeds(seed, len(bounds))))]
+
+# ===== SAMPLERS =====
+
+_PRIMES = []
+
+def _first_primes(n):
+    """First n primes (cached), used as Halton bases"""
+    if len(_PRIMES) < n:
+        limit = max(16, int(n * (math.log(n + 1) + math.log(math.log(n + 2)) + 2)))
+        sieve = np.ones(limit + 1, dtype=bool)
+        sieve[:2] = False
+        for p in range(2, int(limit ** 0.5) + 1):
+            if sieve[p]:
+                sieve[p * p::p] = False
+        _PRIMES[:] = np.flatnonzero(sieve).tolist()
+    return _PRIMES[:n]
+
+def _scrambled_halton(rng, n, dims):
+    """(dims, n) randomized Halton points in (0, 1)
+
+    Each dimension uses a random permutation of the digits at every position
+    plus a uniform tail below the last significant digit, so every point is
+    marginally uniform and independent scramblings give unbiased replicates.
+    """
+    index = np.arange(n)
+    points = np.empty((dims, n))
+    for d, base in enumerate(_first_primes(dims)):
+        n_digits = max(1, math.ceil(math.log(max(n, 2)) / math.log(base)))
+        remaining = index.copy()
+        value = np.zeros(n)
+        scale = 1.0 / base
+        for _ in range(n_digits):
+            remaining, digit = np.divmod(remaining, base)
+            value += rng.permutation(base)[digit] * scale
+            scale /= base
+        points[d] = value + rng.random(n) * scale * base
+    return np.clip(points, 1e-12, 1 - 1e-12)
+
+def _norm_ppf(u):
+    """Inverse standard normal CDF (Acklam's rational approximation, |rel err| < 1.2e-9)"""
+    a = (-3.969683028665376e+01, 2.209460984245205e+02, -2.759285104469687e+02,
+         1.383577518672690e+02, -3.066479806614716e+01, 2.506628277459239e+00)
+    b = (-5.447609879822406e+01, 1.615858368580409e+02, -1.556989798598866e+02,
+         6.680131188771972e+01, -1.328068155288572e+01)
+    c = (-7.784894002430293e-03, -3.223964580411365e-01, -2.400758277161838e+00,
+         -2.549732539343734e+00, 4.374664141464968e+00, 2.938163982698783e+00)
+    d = (7.784695709041462e-03, 3.224671290700398e-01, 2.445134137142996e+00,
+         3.754408661907416e+00)
+
+    q = np.where(u < 0.5, u, 1 - u)
+    tail = q < 0.02425
+    r = np.sqrt(-2 * np.log(np.where(tail, q, 0.5)))
+    tail_value = (((((c[0] * r + c[1]) * r + c[2]) * r + c[3]) * r + c[4]) * r + c[5]) / \
+                 ((((d[0] * r + d[1]) * r + d[2]) * r + d[3]) * r + 1)
+    s = q - 0.5
+    t = s * s
+    central = (((((a[0] * t + a[1]) * t + a[2]) * t + a[3]) * t + a[4]) * t + a[5]) * s / \
+              (((((b[0] * t + b[1]) * t + b[2]) * t + b[3]) * t + b[4]) * t + 1)
+    lower = np.where(tail, tail_value, central)
+    return np.where(u < 0.5, lower, -lower)
+
+def _shocks(rng, months, n, sampler, antithetic):
+    """(assets, months * n) standard normal shocks, path index fastest"""
+    n_assets = len(ASSET_CLASSES)
+    drawn = n // 2 if antithetic else n
+    if sampler == 'halton':
+        # Dimension order is month-major so early months get the best-spread bases
+        u = _scrambled_halton(rng, drawn, months * n_assets)
+        z = _norm_ppf(u).reshape(months, n_assets, drawn).transpose(1, 0, 2)
+    else:
+        z = rng.standard_normal((n_assets, months, drawn))
+    if antithetic:
+        # Path i and path i + n / 2 are mirror images
+        z = np.concatenate((z, -z), axis=2)
+    return z.reshape(n_assets, months * n)
+
+# ===== PATH SIMULATION =====
+
+def _simulate_batch(seed_seq, model, out):
+    """Fill ``out``, a (months + 1, n) view, with wealth paths for one batch"""
+    rng = np.random.default_rng(seed_seq)
+    log_mean, chol = _market_model()
+    months, n = out.shape[0] - 1, out.shape[1]
+
+    # Asset-major layout keeps the correlation step a single BLAS product
+    log_returns = chol @ _shocks(rng, months, n, model['sampler'], model['antithetic'])
+    log_returns += log_mean[:, None]
+    np.exp(log_returns, out=log_returns)
+    gross = (model['weights'] @ log_returns).reshape(months, n)
+
+    out[0] = model['initial']
+    for month in range(months):
+        np.multiply(out[month], gross[month], out=out[month + 1])
+        out[month + 1] += model['monthly']
+    return out
+
+def _batch_stats(index, final, model):
+    """Sufficient statistics over the independent units of one batch
+
+    A unit is a path, an antithetic pair (averaged) or, for the randomized
+    Halton sampler, the whole batch (one replicate). Y is the goal indicator
+    and C the final value (the control variate); sums are returned as
+    (index, n, sum Y, sum C, sum Y^2, sum C^2, sum YC, paths).
+    """
+    goal = model['goal']
+    y = (final >= goal).astype(float) if goal is not None else np.zeros_like(final)
+    c = final
+    if model['antithetic']:
+        half = final.size // 2
+        y = (y[:half] + y[half:]) / 2
+        c = (c[:half] + c[half:]) / 2
+    if model['sampler'] == 'halton':
+        y = np.array([y.mean()])
+        c = np.array([c.mean()])
+    return (index, y.size, float(y.sum()), float(c.sum()), float(y @ y), float(c @ c), float(y @ c),
+            final.size)
+
+def _estimates(stats, model):
+    """Mean final value and goal probability with standard errors from batch stats
+
+    Halton replicates are weighted by their paths. Standard errors need at
+    least two independent units (paths, antithetic pairs or replicates) and
+    are NaN otherwise.
+    """
+    stats = sorted(stats)  # reduce in batch order: independent of worker count
+    if model['sampler'] == 'halton':
+        weights = np.array([s[7] for s in stats], dtype=float)
+        weights /= weights.sum()
+        y = np.array([s[2] for s in stats])
+        c = np.array([s[3] for s in stats])
+        mean_y, mean_c = float(weights @ y), float(weights @ c)
+        # Variances of the weighted means, from the spread between replicates
+        scale = len(stats) / (len(stats) - 1) if len(stats) > 1 else math.nan
+        spread = weights ** 2 * scale
+        var_y = float(spread @ (y - mean_y) ** 2)
+        var_c = float(spread @ (c - mean_c) ** 2)
+        cov_yc = float(spread @ ((y - mean_y) * (c - mean_c)))
+    else:
+        n, sy, sc, syy, scc, syc = (math.fsum(s[i] for s in stats) for i in range(1, 7))
+        mean_y, mean_c = sy / n, sc / n
+        dof = (n - 1) * n if n > 1 else math.nan
+        var_y = max(syy - n * mean_y ** 2, 0.0) / dof
+        var_c = max(scc - n * mean_c ** 2, 0.0) / dof
+        cov_yc = (syc - n * mean_y * mean_c) / dof
+
+    result = {
+        'mean_final': mean_c,
+        'mean_final_se': math.sqrt(var_c),
+        'probability_of_goal': None,
+        'probability_se': None
+    }
+    if model['goal'] is not None:
+        probability, var_p = mean_y, var_y
+        if model['control_variate'] and var_c > 0:
+            beta = cov_yc / var_c
+            probability = mean_y - beta * (mean_c - model['expected_final'])
+            var_p = max(var_y - cov_yc ** 2 / var_c, 0.0)
+            result['control_beta'] = beta
+        result['probability_of_goal'] = float(min(max(probability, 0.0), 1.0))
+        result['probability_se'] = math.sqrt(var_p)
+    return result
+
+def _fill_shared_batch(shm_name, shape, index, start, stop, seed_seq, model):
+    """Process-pool task: simulate one batch directly into the shared wealth array"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        wealth = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+        _simulate_batch(seed_seq, model, wealth[:, start:stop])
+        stats = _batch_stats(index, wealth[-1, start:stop], model)
+        del wealth
+    finally:
+        shm.close()
+    return stats
+
+# ===== PARALLEL EXECUTION =====
+
+_pools = {}
+
+def _process_pool(workers):
+    """Process pool reused across calls, one per worker count"""
+    if workers not in _pools:
+        _pools[workers] = ProcessPoolExecutor(max_workers=workers)
+    return _pools[workers]
+
+@atexit.register
+def _shutdown_pools():
+    for pool in _pools.values():
+        pool.shutdown(cancel_futures=True)
+    _pools.clear()
+
+def _simulate_parallel(specs, model, shape, workers, summarize):
+    """Run batches across a process pool, merging through one shared-memory array"""
+    shm = shared_memory.SharedMemory(create=True, size=max(int(np.prod(shape)) * 8, 1))
+    try:
+        wealth = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+        pool = _process_pool(workers)
+        futures = [pool.submit(_fill_shared_batch, shm.name, shape, index, start, stop,
+                               seed_seq, model)
+                   for index, (start, stop), seed_seq in specs]
+        stats = [future.result() for future in futures]
+        result = summarize(wealth, stats)
+        del wealth
+    finally:
+        shm.close()
+        shm.unlink()
+    return result
+
+def _summarize(wealth, stats, model, percentiles):
+    """Exact percentile bands plus estimates from the full wealth array"""
+    months = wealth.shape[0] - 1
+    bands = np.percentile(wealth, percentiles, axis=1)
+    result = {
+        'months': np.arange(months + 1),
+        'years': np.arange(months + 1) / 12,
+        'percentiles': {p: band for p, band in zip(percentiles, bands)},
+        'final_percentiles': {p: float(band[-1]) for p, band in zip(percentiles, bands)},
+        'n_paths': wealth.shape[1]
+    }
+    result.update(_estimates(stats, model))
+    return result
+
+# ===== STREAMING PERCENTILES =====
+
+class QuantileSketch:
+    """Mergeable per-month quantile sketch with bounded relative error
+
+    Values are counted in logarithmic buckets ``(gamma^(k-1), gamma^k]`` with
+    ``gamma = (1 + a) / (1 - a)`` and each bucket reports ``2 gamma^k / (gamma + 1)``,
+    so a quantile is within relative error ``a = relative_accuracy`` of the exact
+    order statistic at rank ``floor(q * (n - 1))``. The guarantee holds for values
+    in ``[min_value, max_value]``; smaller values (including zero or negative
+    wealth) share one bucket reported as 0 and larger ones are clamped to the
+    top bucket. Memory is rows x buckets counts, independent of path count, and
+    sketches merge by adding counts, so merge order never changes the result.
+    """
+
+    def __init__(self, n_rows, relative_accuracy=0.005, min_value=1.0, max_value=1e15):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.offset = math.ceil(math.log(min_value) / self.log_gamma)
+        n_buckets = math.ceil(math.log(max_value) / self.log_gamma) - self.offset + 2
+        self.counts = np.zeros((n_rows, n_buckets), dtype=np.int64)
+
+    @property
+    def count(self):
+        return int(self.counts[0].sum())
+
+    def add(self, values):
+        """Count a (rows, n) block of values, one row per month"""
+        n_rows, n_buckets = self.counts.shape
+        with np.errstate(divide='ignore', invalid='ignore'):
+            keys = np.ceil(np.log(values) / self.log_gamma) - self.offset + 1
+        keys = np.where(keys >= 1, np.minimum(keys, n_buckets - 1), 0).astype(np.int64)
+        keys += np.arange(n_rows)[:, None] * n_buckets
+        self.counts += np.bincount(keys.ravel(), minlength=self.counts.size).reshape(n_rows, n_buckets)
+
+    def merge(self, other):
+        self.counts += other.counts
+        return self
+
+    def quantiles(self, percentiles):
+        """(len(percentiles), rows) array of estimated percentiles"""
+        cumulative = np.cumsum(self.counts, axis=1)
+        total = cumulative[:, -1:]
+        estimates = []
+        for p in percentiles:
+            rank = np.floor(p / 100 * (total - 1))
+            keys = np.argmax(cumulative > rank, axis=1)
+            values = 2 * self.gamma ** (keys + self.offset - 1) / (self.gamma + 1)
+            estimates.append(np.where(keys == 0, 0.0, values))
+        return np.array(estimates)
+
+def _iter_sketched(specs, model, months, relative_accuracy, simulate_batch=_simulate_batch):
+    """Simulate batches through one reused buffer, yielding (sketch, stats, paths) after each"""
+    sketch = QuantileSketch(months + 1, relative_accuracy)
+    buffer = np.empty((months + 1, max((stop - start for _, (start, stop), _ in specs), default=0)))
+    stats = []
+    for index, (start, stop), seed_seq in specs:
+        wealth = simulate_batch(seed_seq, model, buffer[:, :stop - start])
+        sketch.add(wealth)
+        stats.append(_batch_stats(index, wealth[-1], model))
+        yield sketch, stats, stop
+
+def _sketch_batches(specs, model, months, relative_accuracy):
+    """Simulate batches into a sketch plus per-batch stats"""
+    sketch, stats = QuantileSketch(months + 1, relative_accuracy), []
+    for sketch, stats, _ in _iter_sketched(specs, model, months, relative_accuracy):
+        pass
+    return sketch, stats
+
+def _sketch_summary(sketch, stats, model, percentiles):
+    """Percentile bands from a sketch plus estimates from batch stats"""
+    months = sketch.counts.shape[0] - 1
+    bands = sketch.quantiles(percentiles)
+    result = {
+        'months': np.arange(months + 1),
+        'years': np.arange(months + 1) / 12,
+        'percentiles': {p: band for p, band in zip(percentiles, bands)},
+        'final_percentiles': {p: float(band[-1]) for p, band in zip(percentiles, bands)},
+        'n_paths': sketch.count,
+        'relative_error': sketch.relative_accuracy
+    }
+    result.update(_estimates(stats, model))
+    return result
+
+def _iter_summaries(specs, model, months, percentiles, relative_accuracy,
+                    simulate_batch=_simulate_batch, growth=SUMMARY_GROWTH):
+    """Simulate batches in order, yielding the summary of every path so far as they finish
+
+    Paths stream through a QuantileSketch, so memory is constant in the
+    number of paths. Summaries follow the first batch, then each batch that
+    has grown the paths ``growth`` times since the last summary, and always
+    the last batch; ``growth=None`` summarizes the finished run only.
+    Summaries carry ``progress``, the fraction of paths simulated.
+    """
+    n_paths = specs[-1][1][1] if specs else 0
+    due = 0 if growth else n_paths
+    for sketch, stats, done in _iter_sketched(specs, model, months, relative_accuracy,
+                                              simulate_batch):
+        if done >= due or done == n_paths:
+            result = _sketch_summary(sketch, stats, model, percentiles)
+            result['progress'] = done / n_paths
+            yield result
+            due = done * (growth or 1)
+
+def _simulate_streaming(specs, model, months, workers, relative_accuracy, percentiles):
+    """Stream batches through mergeable sketches; memory is constant in path count"""
+    if workers and workers > 1 and len(specs) > 1:
+        pool = _process_pool(workers)
+        futures = [pool.submit(_sketch_batches, specs[i::workers], model, months, relative_accuracy)
+                   for i in range(workers)]
+        parts = [future.result() for future in futures]
+    else:
+        parts = [_sketch_batches(specs, model, months, relative_accuracy)]
+
+    sketch = QuantileSketch(months + 1, relative_accuracy)
+    stats = []
+    for part_sketch, part_stats in parts:
+        sketch.merge(part_sketch)
+        stats.extend(part_stats)
+    return _sketch_summary(sketch, stats, model, percentiles)
+
+# ===== SIMULATORS =====
+
+def _portfolio_setup(allocation, initial, monthly, years, n_paths, seed, goal, sampler,
+                     antithetic, control_variate):
+    """(model, batch specs, wealth shape) for a portfolio simulation"""
+    if sampler not in SAMPLERS:
+        raise ValueError(f"sampler must be one of {SAMPLERS}")
+    months = int(years * 12)
+    if antithetic:
+        n_paths += n_paths % 2
+
+    model = {
+        'weights': allocation_weights(allocation),
+        'initial': initial,
+        'monthly': monthly,
+        'goal': goal,
+        'sampler': sampler,
+        'antithetic': antithetic,
+        'control_variate': control_variate,
+        'expected_final': expected_final_value(allocation, initial, monthly, years)
+    }
+    bounds = (_replicate_bounds(n_paths, step=2 if antithetic else 1) if sampler == 'halton'
+              else None)
+    return model, _batch_specs(n_paths, seed, bounds), (months + 1, n_paths)
+
+@timed('sim.portfolio')
+@coalesced
+def simulate_portfolio(allocation, initial, monthly, years, n_paths=10000, seed=None,
+                       goal=None, percentiles=DEFAULT_PERCENTILES, workers=None,
+                       streaming=False, relative_accuracy=0.005, sampler='pseudo',
+                       antithetic=False, control_variate=False):
+    """Simulate wealth paths for an allocation, rebalanced monthly
+
+    ``allocation`` is a percentage dict like ``get_risk_profile()['allocation']``.
+    Returns percentile bands per month, final-value percentiles, the mean final
+    value and, when ``goal`` is given, the probability that final wealth reaches
+    it, each with its standard error.
+
+    With ``workers > 1`` path batches run in a process pool and write into one
+    shared-memory array. Every batch draws from its own stream spawned from
+    ``seed``, so results are bit-identical for any worker count.
+
+    ``streaming=True`` never holds all paths: batches feed a QuantileSketch per
+    month, so memory is constant in ``n_paths`` and each percentile is within
+    ``relative_accuracy`` (relative) of the exact order statistic.
+
+    Variance reduction: ``antithetic`` pairs every path with its mirrored
+    shocks; ``control_variate`` corrects the goal probability with final wealth,
+    whose expectation is known in closed form (see expected_final_value);
+    ``sampler='halton'`` draws scrambled Halton points, one independent
+    scrambling per replicate (at least HALTON_REPLICATES of them), and
+    estimates standard errors from the spread between replicates.
+
+    Identical concurrent calls share one run (see cache.coalesced).
+    """
+    model, specs, shape = _portfolio_setup(allocation, initial, monthly, years, n_paths, seed,
+                                           goal, sampler, antithetic, control_variate)
+    months = shape[0] - 1
+
+    if streaming:
+        return _simulate_streaming(specs, model, months, workers, relative_accuracy, percentiles)
+
+    def summarize(wealth, stats):
+        return _summarize(wealth, stats, model, percentiles)
+
+    if workers and workers > 1 and len(specs) > 1:
+        return _simulate_parallel(specs, model, shape, workers, summarize)
+
+    wealth = np.empty(shape)
+    stats = []
+    for index, (start, stop), seed_seq in specs:
+        _simulate_batch(seed_seq, model, wealth[:, start:stop])
+        stats.append(_batch_stats(index, wealth[-1, start:stop], model))
+    return summarize(wealth, stats)
+
+def iter_simulate_portfolio(allocation, initial, monthly, years, n_paths=10000, seed=None,
+                            goal=None, percentiles=DEFAULT_PERCENTILES, relative_accuracy=0.005,
+                            sampler='pseudo', antithetic=False, control_variate=False):
+    """Yield refining results of simulate_portfolio as batches of paths complete
+
+    Updates come after the first batch and then each time the paths simulated
+    have doubled (see SUMMARY_GROWTH). Each result summarizes the paths
+    simulated so far and carries ``progress``, the fraction done; the last
+    matches simulate_portfolio with ``streaming=True`` for the same arguments
+    (memory is constant in ``n_paths``). Batches run in the consuming thread,
+    so a caller can stop between them by closing the generator.
+    """
+    model, specs, shape = _portfolio_setup(allocation, initial, monthly, years, n_paths, seed,
+                                           goal, sampler, antithetic, control_variate)
+    yield from _iter_summaries(specs, model, shape[0] - 1, percentiles, relative_accuracy)
+
+def simulate_risk_profile(risk_score, initial, monthly, years, **kwargs):
+    """Simulate the allocation that get_risk_profile assigns to ``risk_score``"""
+    profile = get_risk_profile(risk_score)
+    result = simulate_portfolio(profile['allocation'], initial, monthly, years, **kwargs)
+    result['profile'] = profile['name']
+    return result
+
+def paths_for_precision(result, target_se):
+    """Paths needed for the goal probability to reach ``target_se``, from a pilot run"""
+    se = result['probability_se']
+    if se is None or math.isnan(se):
+        raise ValueError("the pilot run has no standard error: pass a goal and enough paths "
+                         "for at least two independent units")
+    if not se:
+        return result['n_paths']
+    return int(math.ceil(result['n_paths'] * (se / target_se) ** 2))
+
+# ===== RETIREMENT =====
+
+# Volatility assumed for retirement savings: a balanced 60/40 equity/debt mix
+RETIREMENT_VOLATILITY = blended_volatility({'Equity': 60, 'Debt': 40})
+
+def _simulate_retirement_batch(seed_seq, model, out):
+    """Fill ``out`` with savings paths, contributing at the start of each month"""
+    rng = np.random.default_rng(seed_seq)
+    months, n = out.shape[0] - 1, out.shape[1]
+    gross = rng.standard_normal((months, n))
+    gross *= model['monthly_vol']
+    gross += model['log_mean']
+    np.exp(gross, out=gross)
+
+    out[0] = model['initial']
+    for month in range(months):
+        np.add(out[month], model['monthly'], out=out[month + 1])
+        out[month + 1] *= gross[month]
+    return out
+
+def _retirement_summaries(current_age, retirement_age, current_savings, monthly_savings,
+                          annual_return, annual_inflation, monthly_expenses, n_paths, seed,
+                          volatility, percentiles, relative_accuracy, growth):
+    """Retirement results from _iter_summaries, with ages and the corpus needed"""
+    plan = calculate_retirement(current_age, retirement_age, current_savings, monthly_savings,
+                                annual_return, annual_inflation, monthly_expenses)
+    months = max(int(round((retirement_age - current_age) * 12)), 0)
+    monthly_vol = volatility / np.sqrt(12)
+    model = {
+        'log_mean': np.log1p(annual_return / 12) - monthly_vol ** 2 / 2,
+        'monthly_vol': monthly_vol,
+        'initial': current_savings,
+        'monthly': monthly_savings,
+        'goal': plan['corpus_needed'],
+        'sampler': 'pseudo',
+        'antithetic': False,
+        'control_variate': False,
+        'expected_final': plan['corpus_projected']
+    }
+    for result in _iter_summaries(_batch_specs(n_paths, seed), model, months, percentiles,
+                                  relative_accuracy, _simulate_retirement_batch, growth):
+        result['ages'] = current_age + result['years']
+        result['corpus_needed'] = plan['corpus_needed']
+        yield result
+
+def iter_simulate_retirement(current_age, retirement_age, current_savings, monthly_savings,
+                             annual_return, annual_inflation, monthly_expenses, n_paths=10000,
+                             seed=None, volatility=RETIREMENT_VOLATILITY,
+                             percentiles=DEFAULT_PERCENTILES, relative_accuracy=0.005):
+    """Yield refining Monte Carlo results for a retirement plan as batches of paths complete
+
+    Savings compound at ``annual_return`` in expectation with ``volatility``
+    (annualized) and contributions at the start of each month, as in
+    calculate_retirement, so the mean corpus matches its 'corpus_projected'.
+    'probability_of_goal' is the chance of reaching 'corpus_needed'; bands
+    are indexed by month, with the matching 'ages', and come from a
+    QuantileSketch (within ``relative_accuracy``). Updates are spaced as in
+    iter_simulate_portfolio.
+    """
+    yield from _retirement_summaries(current_age, retirement_age, current_savings, monthly_savings,
+                                     annual_return, annual_inflation, monthly_expenses, n_paths,
+                                     seed, volatility, percentiles, relative_accuracy,
+                                     SUMMARY_GROWTH)
+
+@timed('sim.retirement')
+@coalesced
+def simulate_retirement(current_age, retirement_age, current_savings, monthly_savings,
+                        annual_return, annual_inflation, monthly_expenses, n_paths=10000,
+                        seed=None, volatility=RETIREMENT_VOLATILITY,
+                        percentiles=DEFAULT_PERCENTILES, relative_accuracy=0.005):
+    """Final result of iter_simulate_retirement, summarized once after every batch has run"""
+    return next(_retirement_summaries(current_age, retirement_age, current_savings,
+                                      monthly_savings, annual_return, annual_inflation,
+                                      monthly_expenses, n_paths, seed, volatility, percentiles,
+                                      relative_accuracy, None), None)
@@ -0,0 +1,81 @@
+"""Tests for the JSON HTTP API under concurrent load"""
+
+import asyncio
+import json
+import time
+
+import pytest
+
+import api
+from scheduler import Scheduler
+
+async def _post(port, path, payload, key=None):
+    """(status, seconds) for one request on its own connection"""
+    start = time.perf_counter()
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    body = json.dumps(payload).encode()
+    head = f'POST {path} HTTP/1.1\r\nConnection: close\r\nContent-Length: {len(body)}\r\n'
+    if key is not None:
+        head += f'X-API-Key: {key}\r\n'
+    writer.write(head.encode() + b'\r\n' + body)
+    response = await reader.read()
+    writer.close()
+    await writer.wait_closed()
+    return int(response.split(b' ', 2)[1]), time.perf_counter() - start
+
+@pytest.fixture
+def slow_batches(monkeypatch):
+    """Small scheduler on which batches and /retirement each take 0.5 s of worker time"""
+    monkeypatch.setattr(api, 'SCHEDULER', Scheduler(workers=2, max_queue=64, session_quota=2))
+    monkeypatch.setattr(api, 'API_KEYS', ('backend',))
+    handle = api.handle
+
+    def slow(method, path, body):
+        if path.endswith('/batch') or path == '/retirement':
+            time.sleep(0.5)
+        return handle(method, path, body)
+
+    monkeypatch.setattr(api, 'handle', slow)
+
+def test_one_clients_batches_do_not_starve_others(slow_batches):
+    async def main():
+        server = await asyncio.start_server(api.handle_connection, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        # Two slow single requests take this client's whole quota
+        plans = [asyncio.ensure_future(_post(port, '/retirement', {
+            'current_age': 30, 'retirement_age': 60 + i, 'current_savings': 0, 'monthly_savings': 1000,
+            'annual_return': 0.1, 'annual_inflation': 0.05, 'monthly_expenses': 20000})) for i in range(2)]
+        await asyncio.sleep(0.1)
+        # Far more waiting batches than the default executor has threads
+        batches = [asyncio.ensure_future(_post(port, '/sip/batch', {'requests': [
+            {'monthly_sip': 1000 + i, 'annual_return': 0.1, 'years': 10}]})) for i in range(40)]
+        await asyncio.sleep(0.1)
+        over_quota = await _post(port, '/sip', {'monthly_sip': 1, 'annual_return': 0.1, 'years': 1})
+        keyed = await _post(port, '/tax', {'income': 1_000_000}, key='backend')
+        unknown_key = await _post(port, '/tax', {'income': 1}, key='guess')
+        statuses = [status for status, _ in await asyncio.gather(*plans, *batches)]
+        server.close()
+        await server.wait_closed()
+        return keyed, over_quota, unknown_key, statuses
+
+    keyed, over_quota, unknown_key, statuses = asyncio.run(main())
+    assert keyed[0] == 200 and keyed[1] < 1.0            # runs ahead of the queued batches
+    assert over_quota[0] == 429 and over_quota[1] < 1.0  # refused at once, not after the backlog
+    assert unknown_key[0] == 401
+    assert statuses == [200] * 42                        # batches over quota wait their turn
+
+@pytest.mark.parametrize('path, body, status', [
+    ('/mutual-funds', {'investment': 1000, 'annual_return': 0.1, 'years': 5, 'is_sip': 'false'}, 400),
+    ('/mutual-funds', {'investment': 1000, 'annual_return': 0.1, 'years': 5, 'is_sip': False}, 200),
+    ('/mutual-funds/batch', {'requests': [{'investment': 1000, 'annual_return': 0.1, 'years': 5,
+                                           'is_sip': 1}]}, 400),
+    ('/mutual-funds/batch', {'requests': [{'investment': 1000, 'annual_return': 0.1, 'years': 5,
+                                           'is_sip': True}, {'investment': 1, 'annual_return': 0.1,
+                                                             'years': 1}]}, 200),
+])
+def test_is_sip_must_be_a_json_boolean(path, body, status):
+    try:
+        code, _ = asyncio.run(api.handle_request('POST', path, json.dumps(body).encode()))
+    except api.APIError as exc:
+        code = exc.status
+    assert code == status
@@ -0,0 +1,48 @@
+"""Tests for the batch runner and the nightly recompute"""
+
+import pandas as pd
+import pytest
+
+import batch
+import nightly
+
+@pytest.fixture
+def book(tmp_path):
+    """Tax book whose regime is set, then blank, then set again, with ids turning to text"""
+    rows = ([(i, 1_000_000, 'old') for i in range(4)] + [(i, 1_000_000, '') for i in range(4, 8)]
+            + [(f'C{i}', 1_000_000, 'new') for i in range(8, 10)])
+    path = tmp_path / 'book.csv'
+    path.write_text('client_id,annual_income,tax_regime\n' +
+                    ''.join(f'{client},{income},{regime}\n' for client, income, regime in rows))
+    return path
+
+@pytest.mark.parametrize('suffix', ['.csv', '.parquet'])
+def test_columns_keep_their_types_across_chunks(book, tmp_path, suffix):
+    destination = tmp_path / f'results{suffix}'
+    summary = batch.run(str(book), str(destination), ['tax'], chunk_size=4,
+                        options={'regime': 'old'}, keep=['client_id', 'tax_regime'])
+    assert summary['rows'] == 10 and summary['chunks'] == 3
+    results = pd.read_csv(destination) if suffix == '.csv' else pd.read_parquet(destination)
+    assert results['client_id'].astype(str).tolist() == [str(i) for i in range(8)] + ['C8', 'C9']
+    taxes = results['tax_total_tax'].tolist()
+    assert taxes[4:8] == taxes[:4]   # blank regimes take the run's --regime
+    assert taxes[8] < taxes[0]       # not the old regime's tax
+    assert sorted(path.name for path in tmp_path.iterdir()) == sorted(['book.csv', destination.name])
+
+def test_failed_run_leaves_no_results_file(tmp_path):
+    destination = tmp_path / 'results.csv'
+    with pytest.raises(RuntimeError):
+        with batch.ChunkWriter(str(destination)) as writer:
+            writer.write({'client_id': ['a', 'b']})
+            raise RuntimeError('calculator failed')
+    assert list(tmp_path.iterdir()) == []
+
+def test_nightly_shards_merge_with_one_schema(book, tmp_path):
+    run_dir = tmp_path / 'run'
+    nightly.recompute(str(book), run_dir, ['tax'], workers=1, shard_size=4,
+                      options={'regime': 'new'}, keep=['client_id', 'tax_regime'])
+    destination = tmp_path / 'results.parquet'
+    assert nightly.merge_shards(run_dir, str(destination)) == 10
+    results = pd.read_parquet(destination)
+    assert results['client_id'].tolist()[-2:] == ['C8', 'C9']
+    assert results['tax_total_tax'].tolist()[4:] == [results['tax_total_tax'][8]] * 6
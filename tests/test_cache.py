@@ -0,0 +1,140 @@
+"""Tests for the result cache and single-flight coalescing"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from cache import ResultCache, SingleFlight, cached, canonical_key
+
+def test_lru_evicts_least_recently_used():
+    store = ResultCache(max_bytes=3000)
+    for key in 'abc':
+        store.put(key, b'x' * 900)
+    store.get('a')
+    store.put('d', b'x' * 900)
+    assert store.peek('a')[0] and not store.peek('b')[0]
+
+def test_cached_calls_compute_once_per_canonical_key():
+    calls = []
+
+    @cached(cache=ResultCache())
+    def double(x):
+        calls.append(x)
+        return {'value': x * 2}
+
+    assert double(10) == double(10.0) == {'value': 20}
+    assert calls == [10]
+    double(10)['extra'] = 1  # callers get their own copy of dict results
+    assert double(10) == {'value': 20}
+
+def test_canonical_key_binds_defaults():
+    def f(a, b=2):
+        pass
+
+    assert canonical_key(f, (1,), {}) == canonical_key(f, (1.0,), {'b': 2})
+
+def test_concurrent_identical_calls_share_one_execution():
+    flights = SingleFlight()
+    calls = []
+    gate = threading.Event()
+
+    def slow(x):
+        calls.append(x)
+        gate.wait(5)
+        return x * 2
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flights.do('k', slow, 21)))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    while flights.stats()['waiting'] < 7:
+        time.sleep(0.01)
+    gate.set()
+    for thread in threads:
+        thread.join(5)
+    assert calls == [21]
+    assert sorted(results) == [(42, False)] + [(42, True)] * 7
+
+def test_unshared_errors_make_followers_retry():
+    flights = SingleFlight()
+    entered = threading.Event()
+    attempts = []
+
+    def refuse_first(who):
+        attempts.append(who)
+        if who == 'leader':
+            entered.set()
+            time.sleep(0.2)
+            raise LookupError('refused')
+        return who
+
+    outcome = {}
+
+    def call(who):
+        try:
+            outcome[who] = flights.do('k', refuse_first, who, unshared=(LookupError,))
+        except LookupError as exc:
+            outcome[who] = exc
+
+    leader = threading.Thread(target=call, args=('leader',))
+    leader.start()
+    assert entered.wait(5)
+    follower = threading.Thread(target=call, args=('follower',))
+    follower.start()
+    leader.join(5)
+    follower.join(5)
+    assert isinstance(outcome['leader'], LookupError)
+    assert outcome['follower'] == ('follower', False)
+
+def test_async_followers_wait_without_threads():
+    flights = SingleFlight()
+    calls = []
+
+    async def compute(x):
+        calls.append(x)
+        await asyncio.sleep(0.1)
+        return x + 1
+
+    async def main():
+        return await asyncio.gather(*[flights.do_async('k', compute, 1) for _ in range(50)])
+
+    results = asyncio.run(main())
+    assert calls == [1]
+    assert results.count((2, False)) == 1 and results.count((2, True)) == 49
+
+def test_async_unshared_error_is_not_handed_to_followers():
+    flights = SingleFlight()
+
+    async def compute(who):
+        await asyncio.sleep(0.05)
+        if who == 'leader':
+            raise LookupError('refused')
+        return who
+
+    async def main():
+        leader = asyncio.ensure_future(flights.do_async('k', compute, 'leader', unshared=(LookupError,)))
+        await asyncio.sleep(0)
+        follower = flights.do_async('k', compute, 'follower', unshared=(LookupError,))
+        return await asyncio.gather(leader, follower, return_exceptions=True)
+
+    leader, follower = asyncio.run(main())
+    assert isinstance(leader, LookupError)
+    assert follower == ('follower', False)
+
+def test_shared_errors_reach_followers():
+    flights = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.05)
+        raise ValueError('bad input')
+
+    async def main():
+        return await asyncio.gather(*[flights.do_async('k', fail) for _ in range(3)],
+                                    return_exceptions=True)
+
+    assert all(isinstance(result, ValueError) for result in asyncio.run(main()))
+    with pytest.raises(ValueError):
+        flights.do('k', int, 'x')
@@ -0,0 +1,123 @@
+"""Tests for the job scheduler"""
+
+import asyncio
+import sys
+import threading
+import time
+
+import pytest
+
+from scheduler import BATCH, INTERACTIVE, QuotaExceeded, Scheduler, SchedulerBusy
+
+def _blocked(scheduler):
+    """Occupy the scheduler's single worker until the returned event is set"""
+    release, started = threading.Event(), threading.Event()
+
+    def block():
+        started.set()
+        release.wait(5)
+
+    job = scheduler.submit(block)
+    assert started.wait(5)
+    return release, job
+
+def test_interactive_jobs_run_before_batch_jobs():
+    scheduler = Scheduler(workers=1)
+    release, _ = _blocked(scheduler)
+    order = []
+    jobs = [scheduler.submit(order.append, name, priority=priority)
+            for name, priority in [('b0', BATCH), ('i0', INTERACTIVE), ('b1', BATCH), ('i1', INTERACTIVE)]]
+    release.set()
+    for job in jobs:
+        job.result(5)
+    assert order == ['i0', 'i1', 'b0', 'b1']
+
+def test_session_quota_and_queue_bound():
+    scheduler = Scheduler(workers=1, max_queue=3, session_quota=2)
+    release, _ = _blocked(scheduler)
+    scheduler.submit(time.sleep, 0, session='a')
+    scheduler.submit(time.sleep, 0, session='a')
+    with pytest.raises(QuotaExceeded):
+        scheduler.submit(time.sleep, 0, session='a')
+    scheduler.submit(time.sleep, 0, session='a', quota=3)  # a per-job quota overrides the default
+    with pytest.raises(SchedulerBusy):
+        scheduler.submit(time.sleep, 0, session='b')
+    assert scheduler.stats()['rejected'] == 2
+    release.set()
+
+def test_degrade_under_load():
+    scheduler = Scheduler(workers=1, max_queue=2, degrade_at=0.5)
+    release, _ = _blocked(scheduler)
+    normal = scheduler.submit(dict, n=100, degrade={'n': 10})
+    degraded = scheduler.submit(dict, n=100, degrade={'n': 10})
+    with pytest.raises(SchedulerBusy):
+        scheduler.submit(dict, n=100, degrade={'n': 10})
+    release.set()
+    assert normal.result(5) == {'n': 100} and not normal.degraded
+    assert degraded.result(5) == {'n': 10} and degraded.degraded
+
+def test_base_exceptions_fail_the_job_not_the_worker():
+    scheduler = Scheduler(workers=1)
+    job = scheduler.submit(sys.exit, 3)
+    with pytest.raises(SystemExit):
+        job.result(5)
+    assert scheduler.submit(int, '7').result(5) == 7
+    assert scheduler.stats()['failed'] == 1
+
+def test_cancel_stops_a_streaming_job():
+    scheduler = Scheduler(workers=1)
+    produced = threading.Event()
+
+    def updates():
+        for i in range(1000):
+            produced.set()
+            time.sleep(0.01)
+            yield i
+
+    job = scheduler.submit(updates, stream=True)
+    assert produced.wait(5)
+    job.cancel()
+    with pytest.raises(Exception):
+        job.result(5)
+    assert job.partial is not None and job.partial < 999
+
+def test_admission_from_an_event_loop_never_blocks_it():
+    scheduler = Scheduler(workers=2, session_quota=1)
+
+    async def main():
+        job = scheduler.submit(time.sleep, 0.3, session='a')
+        start = time.perf_counter()
+        with pytest.raises(QuotaExceeded):
+            scheduler.submit(time.sleep, 0, session='a')
+        assert time.perf_counter() - start < 0.1
+        ticks = 0
+        waiting = asyncio.ensure_future(asyncio.wrap_future(job.future))
+        while not waiting.done():
+            ticks += 1
+            await asyncio.sleep(0.01)
+        assert ticks > 5  # the loop kept running while the job did
+
+    asyncio.run(main())
+
+def test_identical_streaming_requests_share_one_job():
+    scheduler = Scheduler(workers=2)
+    runs = []
+    gate = threading.Event()
+
+    def updates(n):
+        runs.append(n)
+        for i in range(n):
+            gate.wait(5)
+            yield i
+
+    first = scheduler.submit_shared('k', updates, 3, stream=True)
+    second = scheduler.submit_shared('k', updates, 3, stream=True)
+    other = scheduler.submit_shared('other', updates, 2, stream=True)
+    assert first.cancel() is False  # the second handle keeps the job alive
+    assert first.cancelled and not second.cancelled
+    gate.set()
+    assert second.result(5) == 2 and other.result(5) == 1
+    assert sorted(runs) == [2, 3]
+    assert scheduler.stats()['attached'] == 1
+    third = scheduler.submit_shared('k', updates, 3, stream=True)  # finished jobs are not reused
+    assert third.result(5) == 2 and len(runs) == 3
@@ -0,0 +1,44 @@
+"""Tests for the Monte Carlo simulators"""
+
+import math
+
+import pytest
+
+from simulation import (iter_simulate_portfolio, iter_simulate_retirement, paths_for_precision,
+                        simulate_portfolio, simulate_retirement)
+
+ALLOCATION = {'Equity': 60, 'Debt': 40}
+
+def test_progressive_portfolio_ends_at_the_streaming_result():
+    updates = list(iter_simulate_portfolio(ALLOCATION, 100000, 1000, 10, n_paths=20000, seed=1,
+                                           goal=250000))
+    final = simulate_portfolio(ALLOCATION, 100000, 1000, 10, n_paths=20000, seed=1, goal=250000,
+                               streaming=True)
+    assert [update['progress'] for update in updates] == sorted(u['progress'] for u in updates)
+    assert updates[-1]['progress'] == 1.0 and updates[-1]['n_paths'] == 20000
+    assert updates[-1]['final_percentiles'] == final['final_percentiles']
+    assert updates[-1]['probability_of_goal'] == final['probability_of_goal']
+
+def test_sketched_percentiles_stay_close_to_exact():
+    exact = simulate_portfolio(ALLOCATION, 100000, 1000, 10, n_paths=20000, seed=2)
+    sketched = list(iter_simulate_portfolio(ALLOCATION, 100000, 1000, 10, n_paths=20000, seed=2))[-1]
+    for p, value in exact['final_percentiles'].items():
+        assert sketched['final_percentiles'][p] == pytest.approx(value, rel=0.02)
+
+def test_blocking_retirement_matches_the_last_update():
+    args = (30, 60, 500000, 20000, 0.1, 0.06, 50000)
+    last = list(iter_simulate_retirement(*args, n_paths=10000, seed=3))[-1]
+    result = simulate_retirement(*args, n_paths=10000, seed=3)
+    assert result['probability_of_goal'] == last['probability_of_goal']
+    assert result['final_percentiles'] == last['final_percentiles']
+
+def test_halton_standard_error_needs_replicates():
+    result = simulate_portfolio(ALLOCATION, 100000, 1000, 10, n_paths=5000, seed=1, goal=250000,
+                                sampler='halton')
+    assert 0 < result['probability_se'] < 0.05
+    assert paths_for_precision(result, result['probability_se'] / 2) > 5000
+    single = simulate_portfolio(ALLOCATION, 100000, 1000, 10, n_paths=1, seed=1, goal=250000,
+                                sampler='halton')
+    assert math.isnan(single['probability_se'])
+    with pytest.raises(ValueError):
+        paths_for_precision(single, 0.01)